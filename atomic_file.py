@@ -0,0 +1,21 @@
+from pathlib import Path
+import os
+import tempfile
+
+
+def write_text_atomic(path: Path, text: str):
+    """
+    Writes text to path through a temporary file next to it that then replaces it, so nothing ever
+    reads a half written file. Every write has its own temporary file, so two processes saving the
+    same file at once don't write into each other's; the last one to finish wins.
+    """
+    os.makedirs(path.parent, exist_ok=True)
+    f = tempfile.NamedTemporaryFile('w', encoding="utf-8", dir=path.parent, prefix=f".{path.name}.", suffix=".tmp", delete=False)
+    try:
+        with f:
+            f.write(text)
+        os.replace(f.name, path)
+    except BaseException:
+        if os.path.exists(f.name):
+            os.unlink(f.name)
+        raise
@@ -0,0 +1,105 @@
+from concurrent.futures import Future, ThreadPoolExecutor
+import queue
+import tkinter as tk
+from tracing import span
+
+
+class BackgroundJobs:
+    """
+    Runs slow work (solving dyes, reading images) on a worker thread so the window never freezes, and
+    hands the results back to a callback on the Tk main thread through after(). Tk widgets must only
+    be touched from the main thread, so the callbacks are where the GUI gets updated.
+
+    Every job has a key (e.g. "color_ingredients"). Submitting a job for a key supersedes the one
+    that was there before: if the old one hasn't started yet it is cancelled, and if it is already
+    running its result is dropped when it finishes. With a single worker, dragging the slider back
+    and forth queues at most one job per key no matter how many events come in.
+    """
+    # How often (milliseconds) the main thread checks for finished jobs while any are outstanding
+    POLL_MS = 15
+
+    def __init__(self, widget: tk.Misc, max_workers: int = 1):
+        self.widget = widget
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="background")
+        self.results: queue.Queue = queue.Queue()
+
+        # Latest generation and future per key, only the latest generation's result is delivered
+        self.generations: dict[str, int] = {}
+        self.futures: dict[str, Future] = {}
+        self.outstanding = 0
+        self.polling = False
+
+        self.submitted = 0
+        self.cancelled = 0
+        self.dropped = 0
+        self.delivered = 0
+
+    def submit(self, key: str, fn, *args, on_done, on_error=None) -> int:
+        """
+        Runs fn(*args) on the worker and then calls on_done(result) (or on_error(exception)) on the
+        main thread, unless another job was submitted for the same key in the meantime.
+        """
+        self.cancel(key)
+        generation = self.generations.get(key, 0) + 1
+        self.generations[key] = generation
+
+        def run():
+            try:
+                with span("job " + key):
+                    result = fn(*args)
+                self.results.put((key, generation, on_done, result, None))
+            except Exception as e:
+                self.results.put((key, generation, on_error, None, e))
+
+        self.futures[key] = self.executor.submit(run)
+        self.outstanding += 1
+        self.submitted += 1
+        self._schedule_poll()
+        return generation
+
+    def cancel(self, key: str):
+        """Supersedes the job for key (if any) without submitting a new one."""
+        future = self.futures.pop(key, None)
+        if future is None:
+            return
+        self.generations[key] = self.generations.get(key, 0) + 1
+        if future.cancel():
+            self.outstanding -= 1
+            self.cancelled += 1
+
+    def pending(self, key: str) -> bool:
+        return key in self.futures
+
+    def shutdown(self):
+        for key in list(self.futures):
+            self.cancel(key)
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_poll(self):
+        if not self.polling and self.outstanding > 0:
+            self.polling = True
+            self.widget.after(self.POLL_MS, self._poll)
+
+    def _poll(self):
+        self.polling = False
+        while True:
+            try:
+                key, generation, callback, result, error = self.results.get_nowait()
+            except queue.Empty:
+                break
+            self.outstanding -= 1
+
+            if self.generations.get(key) != generation:
+                # A newer job for the same key was submitted (or this one was cancelled) while it ran
+                self.dropped += 1
+                continue
+            del self.futures[key]
+            self.delivered += 1
+
+            if error is None:
+                callback(result)
+            elif callback is not None:
+                callback(error)
+            else:
+                print(f"Background job {key} failed: {error!r}")
+        self._schedule_poll()
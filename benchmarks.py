@@ -0,0 +1,308 @@
+"""
+Benchmarks for the hot paths: scraping the wiki, solving dyes, tinting, and a whole download_images
+build. Everything runs offline: the wiki is a local server that serves the pages in fixtures/wiki
+and the sprites in fixtures/sprites, so runs are comparable between machines and commits.
+
+    python benchmarks.py [--filter NAME] [--repeat N] [--json results.json] [--compare old.json]
+
+With --compare, exits with a non-zero status if anything got more than --threshold times slower.
+"""
+from collections import Counter
+from pathlib import Path
+from urllib.parse import urlparse
+import argparse
+import contextlib
+import functools
+import hashlib
+import http.server
+import io
+import json
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+CWD = Path(__file__).parent
+
+FIXTURES_DIR = CWD / "fixtures"
+WIKI_DIR = FIXTURES_DIR / "wiki"
+SPRITES_DIR = FIXTURES_DIR / "sprites"
+
+# The build benchmark copies these into a scratch directory, so it never touches images/ or data/
+BUILD_FILES = ["*.py"]
+
+# A benchmark is this many times slower than the run it's compared with before it counts as a regression
+REGRESSION_THRESHOLD = 1.25
+
+
+class StandInWiki:
+    """
+    Serves fixtures/wiki/<Title>.html at /<Title>, and a sample sprite for every image the pages
+    link to: the one for the item type (shirt, pants or hat) or, for anything else, an ingredient.
+
+    Like the real wiki, every response has an ETag and a conditional GET (If-None-Match) of
+    something that didn't change is answered with 304. fail(path, n) makes the next n requests of a
+    path fail with 503, and responses counts what every path was answered with.
+    """
+    def __init__(self):
+        from tailoring import _parse_tailoring_page
+
+        self.sprites = {}
+        html = (WIKI_DIR / "Tailoring.html").read_text(encoding="utf-8")
+        with contextlib.redirect_stdout(io.StringIO()):
+            for item in _parse_tailoring_page(html):
+                self.sprites[self.path_of(item.image_url)] = SPRITES_DIR / f"{item.type}.png"
+
+        self.lock = threading.Lock()
+        self.failures: dict[str, int] = {}
+        self.responses: Counter = Counter()
+
+        handler = functools.partial(_StandInWikiHandler, self)
+        self.server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_port}/"
+
+    @staticmethod
+    def path_of(url: str) -> str:
+        """The path a request of url asks for (the pages link to images as BASE_URL + "/mediawiki/...")"""
+        return "/" + urlparse(url).path.lstrip("/")
+
+    def file_for(self, path: str) -> Path | None:
+        if path.startswith("/mediawiki/images/"):
+            return self.sprites.get(path, SPRITES_DIR / "ingredient.png")
+        page = WIKI_DIR / (path.strip("/") + ".html")
+        return page if page.is_file() else None
+
+    def fail(self, path: str, times: int):
+        with self.lock:
+            self.failures[path] = times
+
+    def answer(self, path: str, status: int):
+        """Counts the response to a request of path, or turns it into a 503 if it should fail"""
+        with self.lock:
+            if self.failures.get(path, 0) > 0:
+                self.failures[path] -= 1
+                status = 503
+            self.responses[path, status] += 1
+        return status
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class _StandInWikiHandler(http.server.BaseHTTPRequestHandler):
+    def __init__(self, wiki: StandInWiki, *args, **kwargs):
+        self.wiki = wiki
+        super().__init__(*args, **kwargs)
+
+    def do_GET(self):
+        url_path = self.wiki.path_of(self.path)
+        path = self.wiki.file_for(url_path)
+        if path is None:
+            self.send_error(self.wiki.answer(url_path, 404))
+            return
+        body = path.read_bytes()
+        etag = f'"{hashlib.sha1(body).hexdigest()}"'
+        status = self.wiki.answer(url_path, 304 if self.headers.get("If-None-Match") == etag else 200)
+        if status >= 400:
+            self.send_error(status)
+            return
+        self.send_response(status)
+        self.send_header("ETag", etag)
+        if status == 304:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "image/png" if path.suffix == ".png" else "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def use_wiki(base_url: str):
+    """Points the scrapers at another copy of the wiki"""
+    import wiki
+    import tailoring
+    import dyeing
+    wiki.BASE_URL = tailoring.BASE_URL = dyeing.BASE_URL = base_url
+
+
+def measure(run, repeat: int, setup=None) -> list[float]:
+    """Seconds each of repeat calls of run took, setup (if any) runs untimed before each one"""
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        # The scrapers and the solver print progress, that isn't part of what's measured
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            run()
+            times.append(time.perf_counter() - start)
+    return times
+
+
+def micro_benchmarks(wiki: StandInWiki, scratch: Path) -> dict:
+    """name -> (run, setup), each measured on its own"""
+    import data_snapshot
+    from tailoring import _get_tailoring_data
+    from dyeing import _get_dyeing_info, get_ingredients_choices, clear_choices_cache, get_dye_table
+    from tint_images import tint_image, tint_variants, variant_path, STRENGTHS
+    from PIL import Image
+
+    use_wiki(wiki.base_url)
+    # Always the fixtures, even if there is a saved snapshot
+    data_snapshot._loaded[data_snapshot.SNAPSHOT_PATH] = None
+    with contextlib.redirect_stdout(io.StringIO()):
+        colors = get_dye_table().color_names
+
+    # The tint benchmarks work on a sprite the size it is in the game, like download_images saves it
+    sprite_path = scratch / "shirt" / "Sample" / "original.png"
+    sprite_path.parent.mkdir(parents=True)
+    with Image.open(SPRITES_DIR / "shirt.png") as img:
+        img.resize((img.width // 4, img.height // 4), Image.NEAREST).save(sprite_path)
+    tinted_path = variant_path(sprite_path, "red", 50)
+
+    def solve_all(strength):
+        for color in colors:
+            get_ingredients_choices(color, strength)
+
+    benchmarks = {
+        "scrape/_get_tailoring_data": (_get_tailoring_data, None),
+        "scrape/_get_dyeing_info": (_get_dyeing_info, None),
+    }
+    for strength in STRENGTHS:
+        benchmarks[f"solve/get_ingredients_choices[{strength}]"] = (functools.partial(solve_all, strength), clear_choices_cache)
+    benchmarks["solve/get_ingredients_choices[cached]"] = (lambda: [solve_all(strength) for strength in STRENGTHS], None)
+    benchmarks["tint/tint_image"] = (lambda: tint_image(sprite_path, "red", 50), lambda: tinted_path.unlink(missing_ok=True))
+    benchmarks["tint/tint_variants[all colors]"] = (lambda: tint_variants(sprite_path), None)
+    return benchmarks
+
+
+BUILD_SCRIPT = """
+import json, sys, time
+import benchmarks
+benchmarks.use_wiki(sys.argv[1])
+from download_images import download_images
+start = time.perf_counter()
+download_images(workers=int(sys.argv[2]), atlas=sys.argv[3] == "atlas")
+print(json.dumps({"seconds": time.perf_counter() - start}))
+"""
+
+
+def run_build(build_dir: Path, wiki: StandInWiki, workers: int, mode: str) -> float:
+    result = subprocess.run(
+        [sys.executable, "-c", BUILD_SCRIPT, wiki.base_url, str(workers), mode],
+        cwd=build_dir, capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    # Only the last line is ours, the build prints its progress
+    return json.loads(result.stdout.strip().splitlines()[-1])["seconds"]
+
+
+def macro_benchmarks(wiki: StandInWiki, scratch: Path, workers: int) -> dict:
+    """
+    The whole download_images build, in a fresh copy of the code each time: from nothing (every
+    download and tint) and straight after that again (everything is up to date).
+    """
+    benchmarks = {}
+    for mode in ("atlas", "png"):
+        runs = {"cold": [], "up to date": []}
+
+        def build(runs=runs, mode=mode):
+            build_dir = Path(tempfile.mkdtemp(dir=scratch))
+            for pattern in BUILD_FILES:
+                for path in CWD.glob(pattern):
+                    shutil.copy(path, build_dir)
+            runs["cold"].append(run_build(build_dir, wiki, workers, mode))
+            runs["up to date"].append(run_build(build_dir, wiki, workers, mode))
+            shutil.rmtree(build_dir)
+
+        benchmarks[f"build/download_images[{mode}]"] = (build, runs)
+    return benchmarks
+
+
+def summarize(times: list[float]) -> dict:
+    return {"min": min(times), "median": statistics.median(times), "mean": statistics.fmean(times), "runs": len(times)}
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list[str]:
+    regressions = []
+    print(f"Compared with {baseline.get('created', 'baseline')}:")
+    for name, result in results.items():
+        if name not in baseline["results"]:
+            continue
+        ratio = result["min"] / baseline["results"][name]["min"]
+        status = "REGRESSION" if ratio > threshold else ""
+        print(f"  {name:<44} {ratio:6.2f}x {status}")
+        if ratio > threshold:
+            regressions.append(f"{name} is {ratio:.2f}x slower")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--filter", default="", help="only run benchmarks whose name contains this")
+    parser.add_argument("--repeat", type=int, default=5, help="runs per micro benchmark, the fastest one counts")
+    parser.add_argument("--build-repeat", type=int, default=1, help="runs of each whole build")
+    parser.add_argument("--workers", type=int, default=1, help="tinting processes in the build")
+    parser.add_argument("--json", type=Path, help="save the results here")
+    parser.add_argument("--compare", type=Path, help="results of an earlier run (from --json) to compare with")
+    parser.add_argument("--threshold", type=float, default=REGRESSION_THRESHOLD)
+    args = parser.parse_args()
+
+    results = {}
+    with StandInWiki() as wiki, tempfile.TemporaryDirectory() as scratch:
+        scratch = Path(scratch)
+
+        print("Micro benchmarks (seconds):")
+        for name, (run, setup) in micro_benchmarks(wiki, scratch).items():
+            if args.filter in name:
+                results[name] = summarize(measure(run, args.repeat, setup))
+                print(f"  {name:<44} min {results[name]['min']:9.5f}  median {results[name]['median']:9.5f}")
+
+        print("Build benchmarks (seconds):")
+        for name, (build, runs) in macro_benchmarks(wiki, scratch, args.workers).items():
+            if args.filter in name:
+                for _ in range(args.build_repeat):
+                    build()
+                for kind, times in runs.items():
+                    results[f"{name} {kind}"] = summarize(times)
+                    print(f"  {name + ' ' + kind:<44} min {min(times):9.5f}")
+
+    output = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if args.json is not None:
+        with open(args.json, 'w') as f:
+            json.dump(output, f, indent=1)
+        print(f"Saved results to {args.json}")
+
+    regressions = []
+    if args.compare is not None:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+    for regression in regressions:
+        print(f"FAIL: {regression}")
+    sys.exit(1 if regressions else 0)
+
+
+if __name__ == '__main__':
+    main()
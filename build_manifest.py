@@ -0,0 +1,82 @@
+from pathlib import Path
+import hashlib
+import json
+from atomic_file import write_text_atomic
+from tint_images import TINT_ALGORITHM_VERSION
+
+CWD = Path(__file__).parent
+
+IMAGES_DIR = CWD / "images"
+MANIFEST_PATH = IMAGES_DIR / ".manifest.json"
+
+# Bump whenever the layout below changes, old manifests are then ignored (and everything rebuilt)
+MANIFEST_VERSION = 1
+
+# What every generated image was made from, so a build only redoes the ones whose inputs changed:
+# {
+#     "version": 1,
+#     "outputs": {
+#         "shirt/SailorShirt/red_25.png": "<digest>",          (a variant saved as a PNG)
+#         "shirt/atlas.bin#SailorShirt/red_25": "<digest>",     (a sprite in an atlas)
+#         "shirt/atlas.bin#SailorShirt/original": "<hash>",     (an original in an atlas, file_hash of its PNG)
+#         ...
+#     }
+# }
+# The digest of a variant covers the source sprite's contents, the color's RGB, the strength and
+# TINT_ALGORITHM_VERSION, see variant_digest.
+
+
+def file_hash(path: Path) -> str:
+    with open(path, 'rb') as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def variant_digest(source_hash: str, rgb, strength: int) -> str:
+    r, g, b = (int(value) for value in rgb)
+    return hashlib.sha1(f"{source_hash}:{r},{g},{b}:{strength}:{TINT_ALGORITHM_VERSION}".encode()).hexdigest()
+
+
+def output_key(path: Path) -> str:
+    """A PNG under images/, e.g. "shirt/SailorShirt/red_25.png\""""
+    return path.relative_to(IMAGES_DIR).as_posix()
+
+
+def atlas_output_key(type_dir: Path, sprite_key: str) -> str:
+    """A sprite in the atlas of type_dir, e.g. "shirt/atlas.bin#SailorShirt/red_25\""""
+    return f"{type_dir.relative_to(IMAGES_DIR).as_posix()}/atlas.bin#{sprite_key}"
+
+
+class BuildManifest:
+    """
+    The digest of every image a build generated. Read in one go and written back in one go, so
+    checking thousands of outputs is a dict lookup each instead of a file system call each.
+    """
+    def __init__(self, path: Path = MANIFEST_PATH):
+        self.path = path
+        self.outputs: dict[str, str] = {}
+        if path.exists():
+            with open(path) as f:
+                data = json.load(f)
+            if data.get("version") == MANIFEST_VERSION:
+                self.outputs = data["outputs"]
+            else:
+                print(f"Ignoring {path.name}: it is version {data.get('version')}, expected {MANIFEST_VERSION}")
+
+    def is_fresh(self, key: str, digest: str) -> bool:
+        return self.outputs.get(key) == digest
+
+    def record(self, key: str, digest: str):
+        self.outputs[key] = digest
+
+    def prune(self, keep, belongs=lambda key: True) -> list[str]:
+        """
+        Forgets the outputs that belongs(key) and that aren't in keep, i.e. that nothing is built
+        from anymore. Returns their keys so the caller can delete them.
+        """
+        orphans = [key for key in self.outputs if belongs(key) and key not in keep]
+        for key in orphans:
+            del self.outputs[key]
+        return orphans
+
+    def save(self):
+        write_text_atomic(self.path, json.dumps({"version": MANIFEST_VERSION, "outputs": self.outputs}, separators=(",", ":"), sort_keys=True))
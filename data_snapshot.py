@@ -0,0 +1,122 @@
+from pathlib import Path
+from dataclasses import dataclass
+import json
+import time
+from atomic_file import write_text_atomic
+from items import TailoringItem, IngredientItem
+
+CWD = Path(__file__).parent
+
+SNAPSHOT_PATH = CWD / "data" / "wiki_snapshot.json"
+
+# Bump whenever the layout below (or what the scrapers extract) changes, old snapshots are then ignored
+SNAPSHOT_VERSION = 1
+
+# Layout of the snapshot. Ingredients are stored once and referred to by their index so the items
+# and color tables stay small, and loading gives back one shared IngredientItem per ingredient.
+# {
+#     "version": 1,
+#     "created": 1700000000,
+#     "ingredients": [["Cranberries", "https://stardewvalleywiki.com/..."], ...],
+#     "tailoring": [["Shirt", "https://...", "shirt", true, [0, 12]], ...],
+#     "dyeing": {"red": [[220, 0, 0], [[0, 100], [3, 50], ...]], ...}
+# }
+
+
+@dataclass
+class Snapshot:
+    tailoring_data: list[TailoringItem]
+    dyeing_info: dict
+    created: float
+
+
+_loaded: dict[Path, Snapshot | None] = {}
+
+
+def save_snapshot(tailoring_data: list[TailoringItem], dyeing_info: dict, path: Path = SNAPSHOT_PATH):
+    ingredient_indices: dict[tuple, int] = {}
+
+    def ingredient_index(ingredient: IngredientItem) -> int:
+        key = (ingredient.name, ingredient.image_url)
+        if key not in ingredient_indices:
+            ingredient_indices[key] = len(ingredient_indices)
+        return ingredient_indices[key]
+
+    tailoring = [
+        [item.name, item.image_url, item.type, item.dyeable, [ingredient_index(ingredient) for ingredient in item.ingredients]]
+        for item in tailoring_data
+    ]
+    dyeing = {
+        color: [list(info["rgb"]), [[ingredient_index(ingredient), strength] for ingredient, strength in info["ingredients"].items()]]
+        for color, info in dyeing_info.items()
+    }
+
+    data = {
+        "version": SNAPSHOT_VERSION,
+        "created": int(time.time()),
+        "ingredients": [list(key) for key in ingredient_indices],
+        "tailoring": tailoring,
+        "dyeing": dyeing,
+    }
+
+    write_text_atomic(path, json.dumps(data, separators=(",", ":")))
+    _loaded.pop(path, None)
+
+
+def load_snapshot(path: Path = SNAPSHOT_PATH) -> Snapshot | None:
+    """Returns the saved wiki data, or None if there is no (up to date) snapshot. Only read once per process."""
+    if path in _loaded:
+        return _loaded[path]
+
+    snapshot = None
+    if path.exists():
+        with open(path) as f:
+            data = json.load(f)
+
+        if data.get("version") != SNAPSHOT_VERSION:
+            print(f"Ignoring {path.name}: it is version {data.get('version')}, expected {SNAPSHOT_VERSION}")
+        else:
+            ingredients = [IngredientItem(name=name, image_url=image_url) for name, image_url in data["ingredients"]]
+            tailoring_data = [
+                TailoringItem(name=name, image_url=image_url, type=type_, dyeable=dyeable, ingredients=[ingredients[i] for i in ingredient_indices])
+                for name, image_url, type_, dyeable, ingredient_indices in data["tailoring"]
+            ]
+            dyeing_info = {
+                color: {"rgb": tuple(rgb), "ingredients": {ingredients[i]: strength for i, strength in strengths}}
+                for color, (rgb, strengths) in data["dyeing"].items()
+            }
+            snapshot = Snapshot(tailoring_data, dyeing_info, data["created"])
+
+    _loaded[path] = snapshot
+    return snapshot
+
+
+def refresh_snapshot(path: Path = SNAPSHOT_PATH, html_dir: Path | None = None):
+    """
+    Scrapes the wiki again and overwrites the snapshot. With html_dir, the pages are read from 
+    saved Tailoring.html and Dyeing.html files instead (e.g. fixtures/wiki).
+    """
+    from tailoring import _get_tailoring_data, _parse_tailoring_page
+    from dyeing import _get_dyeing_info, _parse_dyeing_page
+
+    if html_dir is not None:
+        tailoring_data = _parse_tailoring_page((html_dir / "Tailoring.html").read_text(encoding="utf-8"))
+        dyeing_info = _parse_dyeing_page((html_dir / "Dyeing.html").read_text(encoding="utf-8"))
+    else:
+        tailoring_data = _get_tailoring_data()
+        if tailoring_data is None:
+            raise RuntimeError("Failed to download the Tailoring page, the snapshot was not updated")
+        dyeing_info = _get_dyeing_info()
+
+    save_snapshot(tailoring_data, dyeing_info, path)
+    print(f"Saved {len(tailoring_data)} tailoring items and {len(dyeing_info)} colors to {path}")
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Scrape the Stardew Valley wiki and save the tailoring and dyeing data for offline use")
+    parser.add_argument("--path", type=Path, default=SNAPSHOT_PATH)
+    parser.add_argument("--html-dir", type=Path, help="parse saved Tailoring.html and Dyeing.html pages from this directory instead of downloading them")
+    args = parser.parse_args()
+
+    refresh_snapshot(args.path, args.html_dir)
@@ -1,65 +1,308 @@
-from tailoring import tailoring_data
-from dyeing import dyeing_info
+from tailoring import get_tailoring_data
+from dyeing import get_dye_table
+from items import ingredient_registry
 from pathlib import Path
-import requests
+from concurrent.futures import ProcessPoolExecutor
+import argparse
 import os
+from downloader import Downloader, DownloadJob
+from tint_images import tint_all_variants, tint_variants, variant_path, STRENGTHS
+from sprite_atlas import AtlasWriter, atlas_key, get_atlas
+from build_manifest import BuildManifest, IMAGES_DIR, atlas_output_key, file_hash, output_key, variant_digest
 from PIL import Image
-from tint_images import tint_image
+import numpy
 
 CWD = Path(__file__).parent
 
-def download_images():
-    for item in tailoring_data:
-        img_path = Path(CWD / "images" / item.type / sanitize_name(item.name) / "original.png")
-
-        # Download the original image
-        if not img_path.exists():
-            reduce = 3 if item.type == "hat" else 4
-            download_image(item.image_url, img_path, reduce_size_by=reduce)
-        
-        # Get the dyed versions of the image
-        for color in dyeing_info:
-            for strength in [25, 50, 75, 100]:
-                if item.dyeable:
-                    tint_image(img_path, color, strength)
-
-    # Download all ingredient images
-    ingredients = set()
-    for item in tailoring_data:
-        for ingredient in item.ingredients:
-            ingredients.add(ingredient)
-
-    for ingredient in ingredients:
-        img_path = Path(CWD / "images" / "ingredients" / (sanitize_name(ingredient.name) + ".png"))
-        if not img_path.exists():
-            # print(f"Downloading {ingredient.name}")
-            download_image(ingredient.image_url, img_path)
+VALIDATORS_PATH = CWD / "images" / ".validators.json"
+
+
+def item_image_path(item) -> Path:
+    return Path(CWD / "images" / item.type / sanitize_name(item.name) / "original.png")
+
+
+def ingredient_image_path(ingredient) -> Path:
+    return Path(CWD / "images" / "ingredients" / (sanitize_name(ingredient.name) + ".png"))
+
+
+def source_jobs() -> tuple[list[DownloadJob], list[DownloadJob]]:
+    """The downloads of every original tailoring item image and every ingredient image"""
+    tailoring_data = get_tailoring_data()
+    # Loads dyeing_info too, so the ingredient registry has the ingredients from both pages
+    get_dye_table()
+
+    # Resize (nearest neighbor) as many of these are upscaled, see Downloader.download
+    item_jobs = [
+        DownloadJob(item.image_url, item_image_path(item), reduce_size_by=3 if item.type == "hat" else 4)
+        for item in tailoring_data
+    ]
+    # The registry has every ingredient from both tailoring.py and dyeing.py exactly once
+    ingredient_jobs = [DownloadJob(ingredient.image_url, ingredient_image_path(ingredient)) for ingredient in ingredient_registry.ingredients]
+    return item_jobs, ingredient_jobs
+
+
+def download_images(workers: int = 1, download_workers: int = 8, refresh: bool = False, atlas: bool = True):
+    """
+    Downloads every tailoring and ingredient image and renders the dyed variants of the dyeable 
+    items. Downloads run concurrently over a shared connection pool; with workers > 1 the tinting 
+    is split by item and color across a process pool. With refresh set, images that are already on 
+    disk are revalidated against the wiki (ETag/Last-Modified) instead of being skipped.
+
+    With atlas set, the items of each type and all their variants are packed into one
+    images/<type>/atlas.bin (see sprite_atlas.py), otherwise every variant is saved as its own PNG.
+    Either way, images/.manifest.json records what every variant was made from: only the ones whose
+    sprite, color or tint changed since are made again, and ones for items that are gone are deleted.
+    """
+    tailoring_data = get_tailoring_data()
+    item_jobs, ingredient_jobs = source_jobs()
+
+    with Downloader(max_workers=download_workers, validators_path=VALIDATORS_PATH) as downloader:
+        # Download the original images
+        dyeable_images = []
+        images_by_type: dict[str, dict[Path, bool]] = {}
+        for item in tailoring_data:
+            img_path = item_image_path(item)
+            if item.dyeable:
+                dyeable_images.append(img_path)
+            images_by_type.setdefault(item.type, {})[img_path] = item.dyeable
+
+        _report_download_results(downloader.download_all(item_jobs, refresh=refresh), "item")
+
+        # Get the dyed versions of the images (ones that failed to download can't be tinted)
+        manifest = BuildManifest()
+        if atlas:
+            for type_, images in images_by_type.items():
+                render_atlas(CWD / "images" / type_, [(img_path, dyeable) for img_path, dyeable in images.items() if img_path.exists()], workers, manifest)
         else:
-            print(f"Skipping {ingredient.name} (already downloaded)")
-
-    # Download the rest of the ingredient images (from dyeing.py)
-    for color in dyeing_info:
-        for ingredient in dyeing_info[color]["ingredients"]:
-            img_path = Path(CWD / "images" / "ingredients" / (sanitize_name(ingredient.name) + ".png"))
-            if not img_path.exists():
-                # print(f"Downloading {ingredient.name}")
-                download_image(ingredient.image_url, img_path)
-            else:
-                print(f"Skipping {ingredient.name} (already downloaded)")
-
-
-def download_image(url, output_path, reduce_size_by=1):
-    os.makedirs(output_path.parent, exist_ok=True)
-    response = requests.get(url)
-    with open(output_path, 'wb') as f:
-        f.write(response.content)
-
-    #Resize to 8x8 (nearest neighbor) as many of these are upscaled to either 32x32, 48x48, or 54x54
-    # This is to make the images actually pixel perfect as they are in the game
-    if reduce_size_by > 1:
-        img = Image.open(output_path)
-        img = img.resize((img.width // reduce_size_by, img.height // reduce_size_by), Image.NEAREST)
-        img.save(output_path)
+            render_variants([img_path for img_path in dyeable_images if img_path.exists()], workers, manifest)
+        manifest.save()
+
+        # Download all ingredient images
+        _report_download_results(downloader.download_all(ingredient_jobs, refresh=refresh), "ingredient")
+
+
+def _report_download_results(results, kind):
+    downloaded = sum(1 for result in results.values() if result is True)
+    failed = {path: result for path, result in results.items() if isinstance(result, Exception)}
+    print(f"Downloaded {downloaded} {kind} images ({len(results) - downloaded - len(failed)} up to date, {len(failed)} failed)")
+    for path, error in failed.items():
+        print(f"Failed to download {path}: {error}")
+
+
+# How many colors one worker renders per job. Every job loads its base image once, so this trades 
+# load balancing against re-reading the same original.png in several processes.
+COLORS_PER_JOB = 8
+
+def _tint_job(job):
+    img_path, colors, strengths = job
+    return tint_all_variants(img_path, colors, strengths, overwrite=True)
+
+
+def _variant_digests(img_path: Path, dyeable: bool = True, source_hash: str | None = None) -> dict[tuple[str, int], str]:
+    """The manifest digest of every (color, strength) variant of an original image"""
+    if not dyeable:
+        return {}
+    table = get_dye_table()
+    if source_hash is None:
+        source_hash = file_hash(img_path)
+    return {
+        (color, strength): variant_digest(source_hash, table.rgb[table.color_indices[color]], strength)
+        for color in table.color_names for strength in STRENGTHS
+    }
+
+
+def _stale_groups(stale: set[tuple[str, int]], colors: list[str]) -> list[tuple[list[str], list[int]]]:
+    """
+    The stale (color, strength) variants of an image as (colors, strengths) groups that are each
+    tinted in one pass, without tinting a single variant that is up to date: colors with the same
+    stale strengths go together, in the order of colors and STRENGTHS.
+    """
+    groups: dict[tuple[int, ...], list[str]] = {}
+    for color in colors:
+        strengths = tuple(strength for strength in STRENGTHS if (color, strength) in stale)
+        if strengths:
+            groups.setdefault(strengths, []).append(color)
+    return [(group_colors, list(strengths)) for strengths, group_colors in groups.items()]
+
+
+def render_variants(img_paths, workers: int = 1, manifest: BuildManifest | None = None):
+    """
+    Renders the variants of the given original images that are out of date according to the 
+    manifest (or, without one, all of them), and deletes the variant PNGs the manifest knows of 
+    that no longer belong to any of the images. Only the out of date (color, strength) variants are 
+    tinted, see _stale_groups. Serially each group is done in one pass; with workers > 1 the groups 
+    are split by color across a process pool. Both paths write exactly the same files.
+    """
+    colors = get_dye_table().color_names
+
+    stale_groups: dict[Path, list[tuple[list[str], list[int]]]] = {}
+    expected: dict[str, str] = {}
+    for img_path in img_paths:
+        if manifest is None:
+            stale_groups[img_path] = [(colors, list(STRENGTHS))]
+            continue
+        stale = set()
+        for (color, strength), digest in _variant_digests(img_path).items():
+            key = output_key(variant_path(img_path, color, strength))
+            expected[key] = digest
+            if not manifest.is_fresh(key, digest):
+                stale.add((color, strength))
+        if stale:
+            stale_groups[img_path] = _stale_groups(stale, colors)
+
+    if manifest is not None:
+        # PNGs under the item type folders, not atlas sprites (those are dropped when the atlas is rewritten)
+        orphans = manifest.prune(expected, belongs=lambda key: "#" not in key)
+        for key in orphans:
+            (IMAGES_DIR / key).unlink(missing_ok=True)
+        if orphans:
+            print(f"Deleted {len(orphans)} variants that no longer belong to any item")
+
+    tint_jobs = []
+    for img_path, groups in stale_groups.items():
+        for group_colors, strengths in groups:
+            chunk_size = COLORS_PER_JOB if workers > 1 else len(group_colors)
+            tint_jobs.extend((img_path, group_colors[i:i + chunk_size], strengths) for i in range(0, len(group_colors), chunk_size))
+
+    if not tint_jobs:
+        print(f"All variants of {len(img_paths)} items are up to date")
+        return
+
+    total = len(tint_jobs)
+    written = 0
+
+    def finished(job, count):
+        nonlocal written
+        written += count
+        if manifest is not None:
+            img_path, job_colors, strengths = job
+            for color in job_colors:
+                for strength in strengths:
+                    key = output_key(variant_path(img_path, color, strength))
+                    manifest.record(key, expected[key])
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, total // (workers * 8))
+            results = executor.map(_tint_job, tint_jobs, chunksize=chunksize)
+            for done, (job, count) in enumerate(zip(tint_jobs, results), start=1):
+                finished(job, count)
+                _report_tint_progress(done, total, written)
+    else:
+        for done, job in enumerate(tint_jobs, start=1):
+            finished(job, _tint_job(job))
+            _report_tint_progress(done, total, written)
+    print()
+
+
+def _atlas_job(job):
+    img_path, with_original, groups = job
+    original = None
+    if with_original:
+        with Image.open(img_path) as img:
+            original = numpy.array(img.convert("RGBA"))
+    return original, [tint_variants(img_path, colors, strengths) for colors, strengths in groups]
+
+
+def render_atlas(type_dir: Path, images: list[tuple[Path, bool]], workers: int = 1, manifest: BuildManifest | None = None):
+    """
+    Packs the given (original image, dyeable) of one item type and every variant of the dyeable ones
+    into the type's atlas. Sprites that are already in the current atlas (and, with a manifest, up
+    to date) are copied over, only the missing or out of date (color, strength) variants of an item
+    are tinted (see _stale_groups), sprites of items that are gone are left out, and an atlas that
+    is already exactly right isn't rewritten at all.
+    """
+    colors = get_dye_table().color_names
+    original_keys = {img_path: atlas_key(img_path) for img_path, _ in images}
+    variant_keys: dict[Path, dict[tuple[str, int], str]] = {
+        img_path: {(color, strength): atlas_key(variant_path(img_path, color, strength)) for color in colors for strength in STRENGTHS} if dyeable else {}
+        for img_path, dyeable in images
+    }
+    # Manifest key and digest of every sprite, by atlas key. The original's digest is the hash of its
+    # file, so a sprite that was downloaded again is packed again even if the item has no variants.
+    digests: dict[str, str] = {}
+    if manifest is not None:
+        for img_path, dyeable in images:
+            source_hash = file_hash(img_path)
+            digests[original_keys[img_path]] = source_hash
+            digests.update(
+                (variant_keys[img_path][color, strength], digest)
+                for (color, strength), digest in _variant_digests(img_path, dyeable, source_hash).items()
+            )
+        manifest.prune({atlas_output_key(type_dir, key) for key in digests}, belongs=lambda key: key.startswith(atlas_output_key(type_dir, "")))
+
+    def up_to_date(key):
+        if atlas is None or key not in atlas:
+            return False
+        return manifest is None or manifest.is_fresh(atlas_output_key(type_dir, key), digests[key])
+
+    atlas = get_atlas(type_dir)
+    todo = []
+    for img_path, _ in images:
+        stale = {variant for variant, key in variant_keys[img_path].items() if not up_to_date(key)}
+        with_original = not up_to_date(original_keys[img_path])
+        if with_original or stale:
+            todo.append((img_path, with_original, _stale_groups(stale, colors)))
+    total_sprites = sum(1 + len(keys) for keys in variant_keys.values())
+    if not todo and atlas is not None and len(atlas) == total_sprites:
+        print(f"{type_dir / 'atlas.bin'} is up to date ({len(atlas)} sprites)")
+        return
+
+    with AtlasWriter(type_dir) as writer:
+        for img_path, _ in images:
+            for key in [original_keys[img_path], *variant_keys[img_path].values()]:
+                if up_to_date(key):
+                    writer.copy(atlas, key)
+
+        if workers > 1 and len(todo) > 1:
+            executor = ProcessPoolExecutor(max_workers=workers)
+            results = executor.map(_atlas_job, todo, chunksize=max(1, len(todo) // (workers * 8)))
+        else:
+            executor = None
+            results = map(_atlas_job, todo)
+
+        def add(key, image):
+            writer.add(key, image)
+            if manifest is not None:
+                manifest.record(atlas_output_key(type_dir, key), digests[key])
+
+        written = 0
+        try:
+            for done, ((img_path, _, groups), (original, variants)) in enumerate(zip(todo, results), start=1):
+                if original is not None:
+                    add(original_keys[img_path], original)
+                # The variants of a group are in the same order as its colors and strengths
+                for (group_colors, strengths), group_variants in zip(groups, variants):
+                    for c, color in enumerate(group_colors):
+                        for s, strength in enumerate(strengths):
+                            add(variant_keys[img_path][color, strength], group_variants[c, s])
+                            written += 1
+                _report_tint_progress(done, len(todo), written)
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
+    if todo:
+        print()
+    print(f"Packed {len(writer.sprites)} sprites into {type_dir / 'atlas.bin'} ({written} variants of {len(todo)} items tinted)")
+
+
+def _report_tint_progress(done, total, written):
+    if done == total or done % 50 == 0:
+        print(f"\rTinting: {done}/{total} jobs ({written} new variants)", end="", flush=True)
+
 
 def sanitize_name(name):
     return "".join(x for x in name if x.isalnum())
+
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Download the tailoring images and render every dyed variant")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of processes used for tinting")
+    parser.add_argument("--download-workers", type=int, default=8, help="number of concurrent downloads")
+    parser.add_argument("--refresh", action="store_true", help="revalidate images that are already downloaded")
+    parser.add_argument("--png", action="store_true", help="save every variant as its own PNG instead of packing them into atlases")
+    args = parser.parse_args()
+
+    download_images(workers=args.workers, download_workers=args.download_workers, refresh=args.refresh, atlas=not args.png)
@@ -0,0 +1,136 @@
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+import json
+import os
+import tempfile
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from PIL import Image
+from atomic_file import write_text_atomic
+from tracing import traced
+
+
+@dataclass
+class DownloadJob:
+    url: str
+    output_path: Path
+    reduce_size_by: int = 1
+
+
+class Downloader:
+    """
+    Downloads files over one pooled requests.Session with bounded concurrency. Failed requests are
+    retried with exponential backoff, files are written to a temporary file and renamed into place
+    (so an interrupted run never leaves a truncated file behind), and the ETag/Last-Modified of
+    every download is remembered so a refresh only re-downloads what changed on the server.
+    """
+
+    def __init__(self, max_workers: int = 8, retries: int = 3, backoff_factor: float = 0.5, timeout: float = 10, validators_path: Path | None = None):
+        self.max_workers = max_workers
+        self.timeout = timeout
+        self.validators_path = validators_path
+
+        self.session = requests.Session()
+        retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504), allowed_methods=("GET",))
+        adapter = HTTPAdapter(pool_connections=max_workers, pool_maxsize=max_workers, max_retries=retry)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+        self._validators_lock = threading.Lock()
+        self.validators: dict[str, dict[str, str]] = {}
+        if validators_path is not None and validators_path.exists():
+            with open(validators_path) as f:
+                self.validators = json.load(f)
+
+    @traced
+    def download(self, job: DownloadJob, refresh: bool = False) -> bool:
+        """
+        Downloads a single file. Existing files are skipped unless refresh is set, in which case a
+        conditional request is made. Returns whether the file on disk changed.
+        """
+        if job.output_path.exists() and not refresh:
+            return False
+
+        headers = {}
+        with self._validators_lock:
+            validators = self.validators.get(job.url, {})
+        if job.output_path.exists():
+            if "etag" in validators:
+                headers["If-None-Match"] = validators["etag"]
+            if "last_modified" in validators:
+                headers["If-Modified-Since"] = validators["last_modified"]
+
+        response = self.session.get(job.url, headers=headers, timeout=self.timeout)
+        if response.status_code == 304:
+            return False
+        response.raise_for_status()
+
+        os.makedirs(job.output_path.parent, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=job.output_path.parent, prefix=f".{job.output_path.stem}.", suffix=".tmp")
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(response.content)
+
+            # Resize (nearest neighbor) as many of these are upscaled to either 32x32, 48x48, or 54x54
+            # This is to make the images actually pixel perfect as they are in the game
+            if job.reduce_size_by > 1:
+                with Image.open(tmp_path) as img:
+                    resized = img.resize((img.width // job.reduce_size_by, img.height // job.reduce_size_by), Image.NEAREST)
+                resized.save(tmp_path, format="PNG")
+
+            os.replace(tmp_path, job.output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+        new_validators = {}
+        if "ETag" in response.headers:
+            new_validators["etag"] = response.headers["ETag"]
+        if "Last-Modified" in response.headers:
+            new_validators["last_modified"] = response.headers["Last-Modified"]
+        with self._validators_lock:
+            if new_validators:
+                self.validators[job.url] = new_validators
+            else:
+                self.validators.pop(job.url, None)
+        return True
+
+    def download_all(self, jobs: list[DownloadJob], refresh: bool = False) -> dict[Path, bool | Exception]:
+        """
+        Downloads all the jobs on a bounded thread pool. Returns, per output path, whether it changed
+        or the exception that made it fail (one bad URL doesn't stop the rest).
+        """
+        # Several items can share the same image, only fetch each output once
+        unique_jobs = list({job.output_path: job for job in jobs}.values())
+
+        def run(job):
+            try:
+                return job.output_path, self.download(job, refresh=refresh)
+            except Exception as e:
+                return job.output_path, e
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = dict(executor.map(run, unique_jobs))
+
+        self.save_validators()
+        return results
+
+    def save_validators(self):
+        if self.validators_path is None:
+            return
+        with self._validators_lock:
+            data = json.dumps(self.validators, indent=1, sort_keys=True)
+        write_text_atomic(self.validators_path, data)
+
+    def close(self):
+        self.session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
@@ -0,0 +1,117 @@
+"""
+Checks the Downloader against the stand-in wiki of benchmarks.py: every sprite of the Tailoring page
+in fixtures/wiki is downloaded, and then has to be
+
+- up to date on a second download_all(refresh=True) (every request a conditional GET answered with
+  304), also with a new Downloader that only has the saved ETags,
+- downloaded again when it changed on the server, and only then,
+- downloaded after a few 503s (the retries), and reported as failed after too many,
+- left as it was when a download fails half way, with no temporary file behind.
+
+    python downloader_check.py
+"""
+from pathlib import Path
+from urllib.parse import urlparse
+import contextlib
+import io
+import sys
+import tempfile
+
+CWD = Path(__file__).parent
+
+WIKI_DIR = CWD / "fixtures" / "wiki"
+SPRITES_DIR = CWD / "fixtures" / "sprites"
+
+
+def download_jobs(scratch: Path):
+    """A job for every item sprite of the fixture Tailoring page, saved under scratch"""
+    from downloader import DownloadJob
+    from tailoring import _parse_tailoring_page
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        items = _parse_tailoring_page((WIKI_DIR / "Tailoring.html").read_text(encoding="utf-8"))
+    jobs = {}
+    for item in items:
+        path = scratch / "images" / item.type / Path(urlparse(item.image_url).path).name
+        jobs[path] = DownloadJob(item.image_url, path, reduce_size_by=3 if item.type == "hat" else 4)
+    return list(jobs.values())
+
+
+def check(wiki, scratch: Path) -> bool:
+    from downloader import Downloader
+
+    validators_path = scratch / "validators.json"
+    jobs = download_jobs(scratch)
+    failures = []
+
+    def expect(what: str, results: dict, changed: set[Path] = frozenset(), failed: set[Path] = frozenset()):
+        wrong = []
+        for path, result in results.items():
+            expected = "failed" if path in failed else "downloaded" if path in changed else "up to date"
+            got = "failed" if isinstance(result, Exception) else "downloaded" if result else "up to date"
+            if got != expected:
+                wrong.append(f"{path.name} {got}, expected {expected}" + (f" ({result})" if isinstance(result, Exception) else ""))
+        failures.extend(f"{what}: {message}" for message in wrong)
+        print(f"{what}: {'ok' if not wrong else f'{len(wrong)} wrong'}")
+
+    def leftovers():
+        return [path.name for path in scratch.rglob("*") if path.name.endswith(".tmp")]
+
+    def sprite_responses(status: int) -> int:
+        return sum(count for (path, answered), count in wiki.responses.items() if answered == status and path.startswith("/mediawiki/images/"))
+
+    with Downloader(max_workers=8, backoff_factor=0.01, validators_path=validators_path) as downloader:
+        every_path = {job.output_path for job in jobs}
+        expect("first download", downloader.download_all(jobs), changed=every_path)
+
+        wiki.responses.clear()
+        expect("refresh", downloader.download_all(jobs, refresh=True))
+        if sprite_responses(304) != len(jobs):
+            failures.append(f"refresh: {sprite_responses(304)} of {len(jobs)} requests were answered with 304")
+
+    with Downloader(max_workers=8, backoff_factor=0.01, validators_path=validators_path) as downloader:
+        expect("refresh with the saved ETags", downloader.download_all(jobs, refresh=True))
+
+        # One sprite changes on the server
+        changed_job = jobs[0]
+        changed_url_path = wiki.path_of(changed_job.url)
+        wiki.sprites[changed_url_path] = SPRITES_DIR / "ingredient.png"
+        expect("refresh after a sprite changed", downloader.download_all(jobs, refresh=True), changed={changed_job.output_path})
+
+        # Two 503s are retried, then it downloads; four are more than the retries
+        retried_job, failing_job = jobs[1], jobs[2]
+        retried_job.output_path.unlink()
+        wiki.fail(wiki.path_of(retried_job.url), 2)
+        failing_before = failing_job.output_path.read_bytes()
+        failing_job.output_path.unlink()
+        wiki.fail(wiki.path_of(failing_job.url), 4)
+        expect("503s", downloader.download_all([retried_job, failing_job], refresh=True), changed={retried_job.output_path}, failed={failing_job.output_path})
+        failing_job.output_path.write_bytes(failing_before)
+
+        # The server sends something that isn't a sprite, the one on disk has to stay as it was
+        broken_job = jobs[3]
+        before = broken_job.output_path.read_bytes()
+        wiki.sprites[wiki.path_of(broken_job.url)] = WIKI_DIR / "Dyeing.html"
+        expect("broken download", downloader.download_all([broken_job], refresh=True), failed={broken_job.output_path})
+        if broken_job.output_path.read_bytes() != before:
+            failures.append(f"broken download: {broken_job.output_path.name} was overwritten")
+
+    if leftovers():
+        failures.append(f"temporary files left behind: {', '.join(leftovers())}")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    print(f"{len(jobs)} sprites, {'every check passed' if not failures else f'{len(failures)} failures'}")
+    return not failures
+
+
+def main():
+    from benchmarks import StandInWiki, use_wiki
+
+    with StandInWiki() as wiki, tempfile.TemporaryDirectory() as scratch:
+        use_wiki(wiki.base_url)
+        sys.exit(0 if check(wiki, Path(scratch)) else 1)
+
+
+if __name__ == '__main__':
+    main()
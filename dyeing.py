@@ -1,7 +1,10 @@
-from bs4 import BeautifulSoup
-import requests
-from items import IngredientItem, IngredientCombination
-import itertools
+from items import IngredientItem, IngredientCombination, ingredient_registry
+import functools
+import math
+from typing import Iterator
+from data_snapshot import load_snapshot
+from wiki import BASE_URL, fetch_page, parse_tables
+from tracing import span, traced
 
 # {
 #     "red": {
@@ -16,15 +19,19 @@ import itertools
 
 
 def _get_dyeing_info():
-    colors = {}
+    with span("wiki.fetch", page="Dyeing"):
+        response = fetch_page("Dyeing")
+    return _parse_dyeing_page(response.text)
+
 
-    base = "https://stardewvalleywiki.com/"
-    url = base + "Dyeing"
-    response = requests.get(url)
-    soup = BeautifulSoup(response.text, "html.parser")
-    tables = soup.find_all("table", {"class": "wikitable"})
+@traced
+def _parse_dyeing_page(html: str):
+    colors = {}
 
-    table = [table for table in tables if "sortable" in table.get("class")][0]
+    base = BASE_URL
+    # The ingredients are in the only table that is both a "wikitable" and "sortable"
+    tables = parse_tables(html, "sortable")
+    table = [table for table in tables if "wikitable" in table.get("class")][0]
     rows = table.find_all("tr")[1:]
 
     for row in rows:
@@ -61,19 +68,386 @@ def _get_dyeing_info():
 
 
 
-dyeing_info = _get_dyeing_info()
+def _load_dyeing_info():
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        colors = snapshot.dyeing_info
+    else:
+        print("No wiki snapshot found, scraping the Dyeing page (run data_snapshot.py to save one)")
+        colors = _get_dyeing_info()
+
+    # Share the ingredients with tailoring_data (and every other user) through the registry
+    for info in colors.values():
+        info["ingredients"] = {ingredient_registry.intern(ingredient): strength for ingredient, strength in info["ingredients"].items()}
+    return colors
+
+
+class DyeTable:
+    """
+    dyeing_info in structure-of-arrays form, indexed by color index and ingredient ID:
+        color_names[c]        the color's name (same order as dyeing_info)
+        rgb[c]                its (r, g, b) as uint8
+        units[c, id]          the ingredient's dye strength for that color in STRENGTH_UNITs, 0 if it can't dye it
+    """
+    __slots__ = ("color_names", "color_indices", "rgb", "units")
+
+    def __init__(self, dyeing_info):
+        # Only needed once the table is used, importing numpy is a noticeable part of startup otherwise
+        import numpy
+
+        self.color_names: list[str] = list(dyeing_info)
+        self.color_indices: dict[str, int] = {color: c for c, color in enumerate(self.color_names)}
+        self.rgb = numpy.array([dyeing_info[color]["rgb"] for color in self.color_names], dtype=numpy.uint8).reshape(-1, 3)
+        self.units = numpy.zeros((len(self.color_names), len(ingredient_registry)), dtype=numpy.uint8)
+        for c, color in enumerate(self.color_names):
+            for ingredient, strength in dyeing_info[color]["ingredients"].items():
+                self.units[c, ingredient_registry.id(ingredient)] = strength // STRENGTH_UNIT
+
+    def ingredients_for(self, color: str):
+        """The IDs (increasing) of the ingredients that can dye this color, and their strengths in units."""
+        row = self.units[self.color_indices[color]]
+        ids = row.nonzero()[0]
+        return ids, row[ids]
+
+    def can_dye(self, color: str, id_: int | None) -> bool:
+        return id_ is not None and id_ < self.units.shape[1] and self.units[self.color_indices[color], id_] > 0
+
+
+_dyeing_info = None
+_dye_table = None
+
+
+def get_dyeing_info():
+    """The dyeing table, loaded the first time it is needed so importing this module does no I/O."""
+    global _dyeing_info
+    if _dyeing_info is None:
+        _dyeing_info = _load_dyeing_info()
+    return _dyeing_info
+
+
+def get_dye_table() -> DyeTable:
+    """The shared DyeTable for the current dyeing_info."""
+    global _dye_table
+    if _dye_table is None:
+        _dye_table = DyeTable(get_dyeing_info())
+    return _dye_table
+
+
+def __getattr__(name):
+    # Keeps `from dyeing import dyeing_info` working, it just loads the data at that point
+    if name == "dyeing_info":
+        return get_dyeing_info()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+
+# Dye strengths are always a multiple of this, the solver counts in these units
+STRENGTH_UNIT = 25
 
+# Without favoured ingredients a choice uses at most this many ingredients. Every favoured 
+# ingredient in a choice allows it to be one ingredient longer (but never more than 2 others).
+MAX_INGREDIENTS = 3
+MAX_OTHER_INGREDIENTS = 2
 
 
+def _enumerate_multisets(units: list[int], favoured: list[bool], target: int, favoured_count: int):
+    """
+    Yields every multiset of ingredient indices (as a list of (index, count), indices increasing) 
+    whose units add up to target, that uses exactly favoured_count distinct favoured ingredients 
+    and is short enough to be a choice. Each multiset is produced exactly once, in lexicographic 
+    order of the indices.
+    """
+    n = len(units)
+    max_size = max(MAX_INGREDIENTS, favoured_count + MAX_OTHER_INGREDIENTS)
+
+    # min_items[i][r]: fewest ingredients from i onwards that add up to exactly r units (for pruning)
+    impossible = target + 1
+    min_items = [[impossible] * (target + 1) for _ in range(n + 1)]
+    min_items[n][0] = 0
+    for i in range(n - 1, -1, -1):
+        for r in range(target + 1):
+            best = min_items[i + 1][r]
+            count = 1
+            while count * units[i] <= r:
+                best = min(best, count + min_items[i + 1][r - count * units[i]])
+                count += 1
+            min_items[i][r] = best
+
+    # favoured_after[i]: how many favoured ingredients there are from i onwards
+    favoured_after = [0] * (n + 1)
+    for i in range(n - 1, -1, -1):
+        favoured_after[i] = favoured_after[i + 1] + favoured[i]
+
+    chosen: list[tuple[int, int]] = []
+
+    def extend(i, remaining, size, favoured_so_far):
+        if remaining == 0:
+            if favoured_so_far == favoured_count:
+                yield list(chosen)
+            return
+        if size + min_items[i][remaining] > max_size or favoured_so_far + favoured_after[i] < favoured_count:
+            return
+        # Every ingredient is worth at least one unit, so the favoured ones still missing have to fit in what's left
+        if favoured_count - favoured_so_far > remaining:
+            return
+
+        for j in range(i, n):
+            if units[j] > remaining:
+                continue
+            favoured_now = favoured_so_far + favoured[j]
+            if favoured_now > favoured_count:
+                continue
+            count = 1
+            while count * units[j] <= remaining and size + count <= max_size:
+                chosen.append((j, count))
+                yield from extend(j + 1, remaining - count * units[j], size + count, favoured_now)
+                chosen.pop()
+                count += 1
+
+    yield from extend(0, target, 0, 0)
+
+
+# How many (color, strength, favoured ingredients) results get_ingredients_choices remembers
+CHOICES_CACHE_SIZE = 256
+
+
+@traced
 def get_ingredients_choices(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> list[IngredientCombination]:
-    """The return value represents the choices the user has available. Each choice is an ingredient or combination of ingredients that can be used to achieve the desired color and strength."""
+    """
+    The return value represents the choices the user has available. Each choice is an ingredient or combination of ingredients that can be used to achieve the desired color and strength.
+    Choices using more of the favoured ingredients come first, and every combination appears once.
+    """
+    return list(_solve_ingredients_choices(desired_color, desired_strength, _favoured_ids(desired_color, favour)))
+
+
+def iter_ingredients_choices(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> Iterator[IngredientCombination]:
+    """The same choices in the same order as get_ingredients_choices, but only worked out as they are iterated over."""
+    return _iter_ingredients_choices(desired_color, desired_strength, _favoured_ids(desired_color, favour))
+
+
+def choices_key(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> tuple:
+    """Everything the choices depend on, equal keys mean the same choices in the same order."""
+    return desired_color, desired_strength, _favoured_ids(desired_color, favour)
+
+
+def _favoured_ids(desired_color: str, favour: list[IngredientItem] | None) -> frozenset[int]:
+    # Only the favoured ingredients that can make this color change the result, so they are all the cache is keyed by
+    table = get_dye_table()
+    return frozenset(id_ for id_ in map(ingredient_registry.find_id, favour or []) if table.can_dye(desired_color, id_))
+
+
+@functools.lru_cache(maxsize=CHOICES_CACHE_SIZE)
+def _solve_ingredients_choices(desired_color: str, desired_strength: int, common_ids: frozenset[int]) -> tuple[IngredientCombination, ...]:
+    # Use as many of the favoured ingredients as possible first
+    print(f"Attempting to use as many of these ingredients as possible: {', '.join([ingredient_registry[id_].name for id_ in common_ids])}")
+
+    return tuple(_iter_ingredients_choices(desired_color, desired_strength, common_ids))
+
+
+def _iter_ingredients_choices(desired_color: str, desired_strength: int, common_ids: frozenset[int]) -> Iterator[IngredientCombination]:
+    if desired_strength <= 0 or desired_strength % STRENGTH_UNIT:
+        return
+
+    # The IDs come out increasing, so every multiset is already sorted the way IngredientCombination stores it
+    ids, units = get_dye_table().ingredients_for(desired_color)
+    ids = ids.tolist()
+    units = units.tolist()
+    favoured = [id_ in common_ids for id_ in ids]
+
+    for favoured_count in range(len(common_ids), -1, -1):
+        for multiset in _enumerate_multisets(units, favoured, desired_strength // STRENGTH_UNIT, favoured_count):
+            flat = []
+            for index, count in multiset:
+                flat.append(ids[index])
+                flat.append(count * units[index])
+            yield IngredientCombination.from_sorted_ids(tuple(flat))
+
+
+class ChoiceCursor:
+    """
+    Steps through the choices for one color and strength without working them all out up front, 
+    only the choices up to the furthest one visited are computed (and kept, for going back). Going 
+    past the last choice wraps around to the first one. Going back stops at the first one: wrapping
+    to the last one would mean working out every choice there is.
+    """
+    __slots__ = ("_choices", "_seen", "_exhausted", "index")
+
+    def __init__(self, desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None):
+        self._choices = iter_ingredients_choices(desired_color, desired_strength, favour)
+        self._seen: list[IngredientCombination] = []
+        self._exhausted = False
+        self.index = 0
+
+    def _compute_up_to(self, index: int) -> bool:
+        """Works out choices until there is one at index, returns False if there are fewer choices than that."""
+        while len(self._seen) <= index and not self._exhausted:
+            choice = next(self._choices, None)
+            if choice is None:
+                self._exhausted = True
+            else:
+                self._seen.append(choice)
+        return index < len(self._seen)
+
+    def __len__(self):
+        # Needs every choice
+        self._compute_up_to(float("inf"))
+        return len(self._seen)
+
+    def __bool__(self):
+        return self._compute_up_to(0)
+
+    def current(self) -> IngredientCombination | None:
+        return self._seen[self.index] if self._compute_up_to(self.index) else None
+
+    def next(self) -> IngredientCombination | None:
+        self.index = self.index + 1 if self._compute_up_to(self.index + 1) else 0
+        return self.current()
+
+    def prev(self) -> IngredientCombination | None:
+        self.index = max(self.index - 1, 0)
+        return self.current()
+
+    def seek(self, index: int) -> IngredientCombination | None:
+        if index < 0 or not self._compute_up_to(index):
+            index = index % len(self) if len(self) else 0
+        self.index = index
+        return self.current()
+
+    def index_of(self, choice: IngredientCombination) -> int:
+        index = 0
+        while self._compute_up_to(index):
+            if self._seen[index] == choice:
+                return index
+            index += 1
+        raise ValueError(f"{choice} is not one of the choices")
+
+
+def _count_choices(units, favoured, max_units: int):
+    """
+    counts[c, t]: how many choices color c has at t units, for the (colors, ingredients) units of a
+    DyeTable and a mask of the same shape of the favoured ingredients. A choice is a multiset of the
+    color's ingredients that adds up to t and has at most max(MAX_INGREDIENTS, k + MAX_OTHER_INGREDIENTS)
+    ingredients, k being how many distinct favoured ones it uses (see _enumerate_multisets).
+
+    Ingredients worth the same number of units are interchangeable for counting, so this multiplies
+    generating functions in x (units), y (ingredients) and z (distinct favoured ingredients) instead
+    of enumerating anything. With n of the other ingredients worth u units the factor is
+    1 / (1 - y x^u)^n: m of them with repeats can be picked in C(n + m - 1, m) ways. With f favoured
+    ones worth u units it is (1 + z y x^u / (1 - y x^u))^f: j distinct of them, m ingredients in all,
+    in C(f, j) * C(m - 1, j - 1) ways. The polynomials are multiplied for every color at once.
+    """
+    import numpy
+
+    colors = units.shape[0]
+    # Every ingredient is worth at least a unit, so no choice is longer than max_units
+    n = max_units + 1
+    # poly[c, k, size, t], starting from 1 (the empty multiset)
+    poly = numpy.zeros((colors, n, n, n), dtype=numpy.int64)
+    poly[:, 0, 0, 0] = 1
+    for u in range(1, max_units + 1):
+        others = ((units == u) & ~favoured).sum(axis=1).astype(numpy.int64)
+        product = poly.copy()
+        coefficient = numpy.ones(colors, dtype=numpy.int64)
+        for m in range(1, max_units // u + 1):
+            # C(n + m - 1, m) from C(n + m - 2, m - 1), the division is exact
+            coefficient = coefficient * (others + m - 1) // m
+            product[:, :, m:, m * u:] += coefficient[:, None, None, None] * poly[:, :, :n - m, :n - m * u]
+        poly = product
+
+        favourites = ((units == u) & favoured).sum(axis=1).astype(numpy.int64)
+        product = poly.copy()
+        distinct = numpy.ones(colors, dtype=numpy.int64)
+        for j in range(1, max_units // u + 1):
+            # C(f, j) from C(f, j - 1)
+            distinct = distinct * (favourites - j + 1) // j
+            for m in range(j, max_units // u + 1):
+                coefficient = distinct * math.comb(m - 1, j - 1)
+                product[:, j:, m:, m * u:] += coefficient[:, None, None, None] * poly[:, :n - j, :n - m, :n - m * u]
+        poly = product
+
+    counts = numpy.zeros((colors, n), dtype=numpy.int64)
+    for k in range(n):
+        counts += poly[:, k, :max(MAX_INGREDIENTS, k + MAX_OTHER_INGREDIENTS) + 1].sum(axis=1)
+    return counts
+
+
+# The choice counts cover every strength up to this one, the strongest a dye gets
+MAX_STRENGTH = 100
+
+# How many different sets of favoured ingredients get_choice_counts remembers the counts for
+CHOICE_COUNTS_CACHE_SIZE = 64
+
+
+def get_choice_counts(favour: list[IngredientItem] | None = None):
+    """
+    counts[c, strength // STRENGTH_UNIT]: how many choices get_ingredients_choices(..., favour) has for
+    the color with DyeTable index c at that strength (0 for 0%), for every strength up to
+    MAX_STRENGTH. Worked out without enumerating any choices (see _count_choices), once per set of
+    favoured ingredients.
+    """
+    return _choice_counts(frozenset(id_ for id_ in map(ingredient_registry.find_id, favour or []) if id_ is not None))
+
+
+@functools.lru_cache(maxsize=CHOICE_COUNTS_CACHE_SIZE)
+def _choice_counts(favoured_ids: frozenset[int]):
+    import numpy
+
+    units = get_dye_table().units
+    favoured = numpy.zeros(units.shape, dtype=bool)
+    favoured[:, [id_ for id_ in favoured_ids if id_ < units.shape[1]]] = True
+    counts = _count_choices(units, favoured & (units > 0), MAX_STRENGTH // STRENGTH_UNIT)
+    counts[:, 0] = 0
+    # Shared by every caller with the same favoured ingredients
+    counts.flags.writeable = False
+    return counts
+
+
+def count_choices(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> int:
+    """len(get_ingredients_choices(desired_color, desired_strength, favour)), looked up instead of solved."""
+    if desired_strength > MAX_STRENGTH:
+        raise ValueError(f"Choices are only counted up to {MAX_STRENGTH}%, not {desired_strength}%")
+    if desired_strength <= 0 or desired_strength % STRENGTH_UNIT:
+        return 0
+    return int(get_choice_counts(favour)[get_dye_table().color_indices[desired_color], desired_strength // STRENGTH_UNIT])
+
+
+def can_make(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> bool:
+    return count_choices(desired_color, desired_strength, favour) > 0
+
+
+def makeable_strengths(desired_color: str, favour: list[IngredientItem] | None = None) -> list[int]:
+    """The strengths (up to MAX_STRENGTH) there is at least one choice for, weakest first."""
+    counts = get_choice_counts(favour)[get_dye_table().color_indices[desired_color]]
+    return [units * STRENGTH_UNIT for units in counts.nonzero()[0].tolist()]
+
+
+def choices_cache_info():
+    """Hits, misses and size of the get_ingredients_choices cache."""
+    return _solve_ingredients_choices.cache_info()
+
+
+def clear_choices_cache():
+    _solve_ingredients_choices.cache_clear()
+
+
+def reload_dyeing_info():
+    """Forgets the dyeing table (and every choice worked out from it), it is loaded again the next time it is needed."""
+    global _dyeing_info, _dye_table
+    _dyeing_info = None
+    _dye_table = None
+    clear_choices_cache()
+    _choice_counts.cache_clear()
+
+
+def _nested_loops_ingredients_choices(desired_color: str, desired_strength: int, favour: list[IngredientItem] | None = None) -> list[IngredientCombination]:
+    """The original brute force version of get_ingredients_choices. Only kept to check the solver against, see solver_check.py."""
     
     choices = []
     
     if favour is None:
         favour = []
 
-    ingredients_for_color = dyeing_info[desired_color]["ingredients"]
+    ingredients_for_color = get_dyeing_info()[desired_color]["ingredients"]
 
     # Use as many of the favoured ingredients as possible first
     common_ingredients_strengths = {}
@@ -81,61 +455,60 @@ def get_ingredients_choices(desired_color: str, desired_strength: int, favour: l
         if favoured_ing in ingredients_for_color:
             common_ingredients_strengths[favoured_ing] = ingredients_for_color[favoured_ing]
 
-    print(f"Attempting to use as many of these ingredients as possible: {', '.join([ingredient.name for ingredient in common_ingredients_strengths.keys()])}")
-
     # Use the favored ingredients
+    import itertools
     for r in range(1, len(common_ingredients_strengths) + 1):
         for combination in itertools.combinations(common_ingredients_strengths.items(), r):
             total_strength = sum(strength for _, strength in combination)
             if total_strength == desired_strength:
-                new_combination = IngredientCombination()
+                new_combination = IngredientCombination.Builder()
                 for ingredient, strength in combination:
                     new_combination.add(ingredient, strength//25)
-                choices.append(new_combination)
+                choices.append(new_combination.build())
             elif total_strength < desired_strength:
                 remaining_strength = desired_strength - total_strength
                 for ingredient, strength in ingredients_for_color.items():
                     if strength == remaining_strength:
-                        new_combination = IngredientCombination()
+                        new_combination = IngredientCombination.Builder()
                         for ing, strng in combination:
                             new_combination.add(ing, strng//25)
                         new_combination.add(ingredient, strength//25)
-                        choices.append(new_combination)
+                        choices.append(new_combination.build())
                     elif strength < remaining_strength:
                         for ingredient_2, strength_2 in ingredients_for_color.items():
                             if strength + strength_2 == remaining_strength:
-                                new_combination = IngredientCombination()
+                                new_combination = IngredientCombination.Builder()
                                 for ing, strng in combination:
                                     new_combination.add(ing, strng//25)
                                 new_combination.add(ingredient, strength//25)
                                 new_combination.add(ingredient_2, strength_2//25)
-                                choices.append(new_combination)
+                                choices.append(new_combination.build())
 
    # Now, use the remaining ingredients
     ingredients_strengths = ingredients_for_color.items()
     
     for ingredient, strength in ingredients_strengths:
         if strength == desired_strength:
-            combination = IngredientCombination()
+            combination = IngredientCombination.Builder()
             combination.add(ingredient, strength//25)
-            choices.append(combination)
+            choices.append(combination.build())
         elif strength < desired_strength:
             desired_strength_2 = desired_strength - strength
             for ingredient_2, strength_2 in ingredients_strengths:
                 if strength_2 == desired_strength_2:
-                    combination = IngredientCombination()
+                    combination = IngredientCombination.Builder()
                     combination.add(ingredient, strength//25)
                     combination.add(ingredient_2, strength_2//25)
-                    choices.append(combination)
+                    choices.append(combination.build())
                 elif strength_2 < desired_strength_2:
                     desired_strength_3 = desired_strength_2 - strength_2
                     for ingredient_3, strength_3 in ingredients_strengths:
                         if strength_3 == desired_strength_3:
-                            combination = IngredientCombination()
+                            combination = IngredientCombination.Builder()
                             combination.add(ingredient, strength//25)
                             combination.add(ingredient_2, strength_2//25)
                             combination.add(ingredient_3, strength_3//25)
-                            choices.append(combination)
+                            choices.append(combination.build())
     
     # Remove duplicates
     return list(dict.fromkeys(choices))
@@ -144,7 +517,7 @@ def get_ingredients_choices(desired_color: str, desired_strength: int, favour: l
 if __name__ == '__main__':
     import random
     print()
-    red_ingredients = dyeing_info["red"]["ingredients"]
+    red_ingredients = get_dyeing_info()["red"]["ingredients"]
     random_red_ingredients = random.sample([(ingredient, strength) for ingredient, strength in red_ingredients.items()], 5)
     print("Random red ingredients:")
     for ingredient, strength in random_red_ingredients:
@@ -172,4 +545,4 @@ if __name__ == '__main__':
             break
     
     if not is_it_here:
-        print("WARNING: 3x Fire Quartz is not here.")
\ No newline at end of file
+        print("WARNING: 3x Fire Quartz is not here.")
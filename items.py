@@ -1,7 +1,7 @@
 from dataclasses import dataclass
 from typing import Literal, List
 
-@dataclass
+@dataclass(slots=True)
 class IngredientItem:
     name: str | None = None
     image_url: str | None = None
@@ -9,7 +9,7 @@ class IngredientItem:
     def __hash__(self):
         return hash(self.name)
 
-@dataclass
+@dataclass(slots=True)
 class TailoringItem:
     name: str | None = None
     image_url: str | None = None
@@ -17,42 +17,117 @@ class TailoringItem:
     ingredients: List[IngredientItem] | None = None
     dyeable: bool | None = None
 
-class IngredientCombination:
+class IngredientRegistry:
+    """
+    Interns every ingredient by name, so the same ingredient is one IngredientItem everywhere (in 
+    tailoring_data and dyeing_info alike), and gives it a dense integer ID in the order it was first 
+    seen. Combinations and the dye table store and compare these IDs instead of IngredientItems.
+    """
+    __slots__ = ("ingredients", "ids")
+
     def __init__(self):
-        self.combination: set[tuple[IngredientItem, int]] = set()
-
-    def add(self, ingredient: IngredientItem, quantity: int):
-        # Check if the ingredient is already in the combination
-        for ingredient_, quantity_ in self.combination:
-            if ingredient_ == ingredient:
-                self.combination.remove((ingredient_, quantity_))
-                quantity += quantity_
-                break
-        self.combination.add((ingredient, quantity))
-
-    # To avoid duplicates, we need to make Python tread the combination of (A, B) and (B, A) as the same combination
+        self.ingredients: list[IngredientItem] = []
+        self.ids: dict[str, int] = {}
+
+    def intern(self, ingredient: IngredientItem) -> IngredientItem:
+        """The one shared IngredientItem with this ingredient's name (the first one seen is kept)."""
+        return self.ingredients[self.id(ingredient)]
+
+    def id(self, ingredient: IngredientItem) -> int:
+        id_ = self.ids.get(ingredient.name)
+        if id_ is None:
+            id_ = len(self.ingredients)
+            self.ids[ingredient.name] = id_
+            self.ingredients.append(ingredient)
+        return id_
+
+    def find_id(self, ingredient: IngredientItem) -> int | None:
+        """Like id() but doesn't register ingredients that haven't been seen yet."""
+        return self.ids.get(ingredient.name)
+
+    def __getitem__(self, id_: int) -> IngredientItem:
+        return self.ingredients[id_]
+
+    def __len__(self):
+        return len(self.ingredients)
+
+
+ingredient_registry = IngredientRegistry()
+
+def ingredient_id(ingredient: IngredientItem) -> int:
+    return ingredient_registry.id(ingredient)
+
+def ingredient_by_id(id_: int) -> IngredientItem:
+    return ingredient_registry[id_]
+
+
+class IngredientCombination:
+    """
+    An immutable combination of ingredients and their quantities, e.g. 2x Cranberries + 1x Hot Pepper.
+    It is stored as one flat tuple of (ingredient ID, quantity) pairs sorted by ID, so (A, B) and 
+    (B, A) are the same combination and the hash only has to be worked out once.
+    Use IngredientCombination.Builder to put one together ingredient by ingredient.
+    """
+    __slots__ = ("_flat", "_hash")
+
+    def __init__(self, quantities: dict[int, int] | None = None):
+        flat = []
+        for id_ in sorted(quantities or ()):
+            flat.append(id_)
+            flat.append(quantities[id_])
+        object.__setattr__(self, "_flat", tuple(flat))
+        object.__setattr__(self, "_hash", hash(self._flat))
+
+    @classmethod
+    def from_sorted_ids(cls, flat: tuple[int, ...]) -> "IngredientCombination":
+        """Skips the sorting, flat must already be (id, quantity, id, quantity, ...) with increasing unique IDs."""
+        combination = object.__new__(cls)
+        object.__setattr__(combination, "_flat", flat)
+        object.__setattr__(combination, "_hash", hash(flat))
+        return combination
+
+    def __setattr__(self, name, value):
+        raise AttributeError("IngredientCombination is immutable, use IngredientCombination.Builder")
+
+    @property
+    def ids(self) -> tuple[int, ...]:
+        return self._flat[::2]
+
+    @property
+    def quantities(self) -> tuple[int, ...]:
+        return self._flat[1::2]
+
+    @property
+    def combination(self) -> tuple[tuple[IngredientItem, int], ...]:
+        """The (ingredient, quantity) pairs in this combination."""
+        return tuple((ingredient_registry[id_], quantity) for id_, quantity in zip(self._flat[::2], self._flat[1::2]))
+
+    def __len__(self):
+        return len(self._flat) // 2
+
     def __eq__(self, other):
         if not isinstance(other, IngredientCombination):
             return False
-        
-        if len(self.combination) != len(other.combination):
-            return False
-        
-        for ingredient, quantity in self.combination:
-            if (ingredient, quantity) not in other.combination:
-                return False
-            
-        return True
-    
+        return self._hash == other._hash and self._flat == other._flat
+
     def __hash__(self):
-        # Sort combinations by ingredient name, then by quantity
-        sorted_combination = sorted(self.combination, key=lambda x: (x[0].name, x[1]))
-        return hash(tuple(sorted_combination))
+        return self._hash
 
     def __str__(self):
-        s = ""
-        for ingredient, quantity in self.combination:
-            qty_modifier = f"{quantity}x " if quantity > 1 else ""
-            s += f"{qty_modifier}{ingredient.name}"
-            s += " + "
-        return s[:-3]
\ No newline at end of file
+        return " + ".join(f"{quantity}x {ingredient.name}" if quantity > 1 else ingredient.name for ingredient, quantity in self.combination)
+
+    def __repr__(self):
+        return f"IngredientCombination({self})"
+
+    class Builder:
+        def __init__(self):
+            self.quantities: dict[int, int] = {}
+
+        def add(self, ingredient: IngredientItem, quantity: int) -> "IngredientCombination.Builder":
+            # The same ingredient added twice is one entry with the quantities summed
+            id_ = ingredient_id(ingredient)
+            self.quantities[id_] = self.quantities.get(id_, 0) + quantity
+            return self
+
+        def build(self) -> "IngredientCombination":
+            return IngredientCombination(self.quantities)
@@ -1,47 +1,278 @@
 from typing import *
 from pathlib import Path
+from collections import Counter, OrderedDict
+import sys
+import time
 import tkinter as tk
 from tkinter import ttk
-from items import IngredientItem, TailoringItem, IngredientCombination
-from dyeing import get_ingredients_choices, dyeing_info
-from tailoring import tailoring_data
-from download_images import download_images, sanitize_name
+from items import IngredientItem, TailoringItem
+from dyeing import ChoiceCursor, can_make, choices_key, get_dye_table, makeable_strengths, MAX_STRENGTH
+from tailoring import get_tailoring_data
+from download_images import sanitize_name
+from outfit_planner import NEW_INGREDIENT_COST, plan_outfit
+from background import BackgroundJobs
+from outfit_renderer import OutfitRenderer
+from variant_provider import variant_provider
+from view_state import ViewState
+from PIL import Image, ImageTk
+import tracing
+from tracing import traced
 
 
 CWD = Path(__file__).parent
 
+# How much decoded (and zoomed) image data the PhotoImage cache may hold on to
+IMAGE_CACHE_BUDGET = 64 * 1024 * 1024
+
+
+class PhotoImageCache:
+    """
+    Decoded PhotoImages keyed by (path, zoom factor), so refreshing the GUI doesn't read and zoom the 
+    same PNGs from disk over and over. Least recently used images are dropped once the (estimated, 
+    4 bytes per pixel) size of everything cached goes over the budget. Widgets that still show an 
+    evicted image keep their own reference to it.
+
+    Images that haven't been tinted or downloaded yet aren't made here (that would block the GUI),
+    get returns None for those and they can be made in the background with variant_provider.get.
+    """
+    def __init__(self, budget_bytes: int = IMAGE_CACHE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self.size_bytes = 0
+        self.images: OrderedDict[tuple[Path, int], ImageTk.PhotoImage] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, path: Path, zoom: int = 1) -> ImageTk.PhotoImage | None:
+        key = (Path(path), zoom)
+        image = self.images.get(key)
+        if image is not None:
+            self.hits += 1
+            self.images.move_to_end(key)
+            return image
+
+        # A miss whether or not the image is available yet, the caller asks again once it is
+        self.misses += 1
+        sprite = variant_provider.peek(path)
+        if sprite is None:
+            return None
+
+        if zoom != 1:
+            sprite = sprite.resize((sprite.width * zoom, sprite.height * zoom), Image.NEAREST)
+        image = ImageTk.PhotoImage(sprite)
+
+        self.images[key] = image
+        self.size_bytes += self._image_bytes(image)
+        while self.size_bytes > self.budget_bytes and len(self.images) > 1:
+            _, evicted = self.images.popitem(last=False)
+            self.size_bytes -= self._image_bytes(evicted)
+            self.evictions += 1
+        return image
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    @staticmethod
+    def _image_bytes(image: ImageTk.PhotoImage) -> int:
+        return image.width() * image.height() * 4
+
+
+image_cache = PhotoImageCache()
+
+
+class VirtualItemGrid:
+    """
+    A scrollable grid of item buttons on a canvas that only has widgets for the rows in view (plus
+    OVERSCAN_ROWS above and below). The buttons are pooled: scrolling or showing other items moves
+    and reconfigures the existing ones instead of destroying and creating widgets, and a button is
+    only touched when what it shows actually changed.
+    """
+    OVERSCAN_ROWS = 1
+
+    def __init__(self, canvas: tk.Canvas, scrollbar: tk.Scrollbar, on_select, on_missing_images, columns: int = 4, cell_width: int = 120, cell_height: int = 80, padding: int = 5):
+        self.canvas = canvas
+        self.scrollbar = scrollbar
+        self.on_select = on_select
+        # Called with the paths of images in view that aren't available yet, refresh again once they are
+        self.on_missing_images = on_missing_images
+        self.columns = columns
+        self.cell_width = cell_width
+        self.cell_height = cell_height
+        self.padding = padding
+
+        # (item, image path, selected) for every item in the grid, whether it has a button or not
+        self.entries: list[tuple[TailoringItem, Path, bool]] = []
+        # Pooled (button, canvas window) pairs and what each one currently shows
+        self.pool: list[tuple[tk.Button, int]] = []
+        self.pool_shows: list[tuple | None] = []
+        self.pool_has_image: list[bool] = []
+
+        self.canvas.configure(yscrollcommand=self._on_scroll)
+        self.canvas.bind("<Configure>", lambda event: self.refresh())
+
+    def set_items(self, entries: list[tuple[TailoringItem, Path, bool]]):
+        self.entries = entries
+        rows = -(-len(entries) // self.columns)
+        self.canvas.configure(scrollregion=(0, 0, self.columns * self.cell_width, rows * self.cell_height))
+        self.refresh()
+
+    def _on_scroll(self, first, last):
+        self.scrollbar.set(first, last)
+        self.refresh()
+
+    @traced
+    def refresh(self):
+        top = self.canvas.canvasy(0)
+        height = max(self.canvas.winfo_height(), int(self.canvas.cget("height")))
+        first_row = max(0, int(top // self.cell_height) - self.OVERSCAN_ROWS)
+        last_row = int((top + height) // self.cell_height) + 1 + self.OVERSCAN_ROWS
+
+        first = first_row * self.columns
+        last = min(len(self.entries), last_row * self.columns)
+        needed = max(0, last - first)
+
+        while len(self.pool) < needed:
+            button = tk.Button(self.canvas, compound=tk.TOP, wraplength=self.cell_width - 4 * self.padding)
+            window = self.canvas.create_window(0, 0, window=button, anchor="nw", width=self.cell_width - 2 * self.padding, height=self.cell_height - 2 * self.padding)
+            self.pool.append((button, window))
+            self.pool_shows.append(None)
+            self.pool_has_image.append(False)
+
+        missing = []
+        for slot, index in enumerate(range(first, last)):
+            button, window = self.pool[slot]
+            item, image_path, selected = self.entries[index]
+            shows = (index, item.name, image_path, selected)
+            if self.pool_shows[slot] == shows and self.pool_has_image[slot]:
+                continue
+
+            image = image_cache.get(image_path, 2)
+            if image is None:
+                missing.append(image_path)
+            button.configure(text=item.name, image=image or "", relief=tk.SUNKEN if selected else tk.RAISED, command=lambda item=item: self.on_select(item))
+            button.image = image
+            row, column = divmod(index, self.columns)
+            self.canvas.coords(window, column * self.cell_width + self.padding, row * self.cell_height + self.padding)
+            self.canvas.itemconfigure(window, state="normal")
+            self.pool_shows[slot] = shows
+            self.pool_has_image[slot] = image is not None
+
+        for slot in range(needed, len(self.pool)):
+            if self.pool_shows[slot] is not None:
+                self.canvas.itemconfigure(self.pool[slot][1], state="hidden")
+                self.pool_shows[slot] = None
+
+        if missing:
+            self.on_missing_images(missing)
+
+
+def first_choices(targets: list[tuple[str, int]], favour: list[IngredientItem]) -> list[ChoiceCursor]:
+    """A cursor per (color, strength) target with its first choice already worked out, wherever this runs."""
+    cursors = [ChoiceCursor(color, strength, favour=favour) for color, strength in targets]
+    for cursor in cursors:
+        cursor.current()
+    return cursors
+
+
+SLOTS = ("shirt", "pants", "hat")
+
+
+def _input(name):
+    """An attribute of CharacterCreator that is an input of its ViewState, setting it marks what reads it stale"""
+    return property(lambda self: self.view_state.get(name), lambda self, value: self.view_state.set(name, value))
+
 
 class CharacterCreator(tk.Tk):
+    shirt_selected = _input("shirt_selected")
+    pants_selected = _input("pants_selected")
+    hat_selected = _input("hat_selected")
+    shirt_color = _input("shirt_color")
+    pants_color = _input("pants_color")
+    hat_color = _input("hat_color")
+    shirt_strength = _input("shirt_strength")
+    pants_strength = _input("pants_strength")
+    hat_strength = _input("hat_strength")
+    # Sprite of each garment as it is dyed now, they are composited into one image in the background
+    shirt_img_path = _input("shirt_img_path")
+    pants_img_path = _input("pants_img_path")
+    hat_img_path = _input("hat_img_path")
+    # What the item grid shows: the open tab's items, dyed with the selected color at the slider's strength
+    current_tab = _input("current_tab")
+    color_currently_selected = _input("color_currently_selected")
+    dye_strength = _input("dye_strength")
+    show_only_dyeable = _input("show_only_dyeable")
+
     def __init__(self):
+        # Cold start timings (seconds since the creator started being built), see startup_benchmark.py
+        self.startup_started = time.perf_counter()
+        self.startup_times: dict[str, float] = {}
+
         super().__init__()
 
         self.title("Character Creator")
         self.geometry("960x640")
 
-        self.color_currently_selected = None
-        self.create_widgets()
-        self.tab_control.bind("<<NotebookTabChanged>>", lambda event: self.update_tab_control_list(self.tab_control.select()))
-
-        self.shirt_color = None
-        self.pants_color = None
-        self.hat_color = None
+        # Solving dyes and reading images happens here, off the main thread
+        self.jobs = BackgroundJobs(self)
 
-        self.shirt_selected = None
-        self.pants_selected = None
-        self.hat_selected = None
+        # Every change goes through here, and only the parts of the window that depend on it are redrawn
+        self.view_state = ViewState(
+            **{f"{slot}_{name}": value for slot in SLOTS for name, value in (("selected", None), ("color", None), ("strength", 0), ("img_path", None))},
+            current_tab="shirt", color_currently_selected=None, dye_strength=0, show_only_dyeable=False,
+        )
         self.item_currently_selected = None
 
-        self.shirt_strength = 0
-        self.pants_strength = 0
-        self.hat_strength = 0
-
-        self.shirt_img = None
-        self.pants_img = None
-        self.hat_img = None
+        # Garments are tinted (and downloaded) as they're needed
+        self.outfit_renderer = OutfitRenderer(load_sprite=variant_provider.get)
+        self.outfit_photo = None
 
-        self.choice_indices: dict[int, int] = {}
-        self.current_color_ingredients_requirements: list[list[IngredientCombination]] = []
+        self.current_color_ingredients_requirements: list[ChoiceCursor] = []
         self.current_clothing_ingredients_requirements: list[IngredientItem] = []
+        # The choices of each dyed slot with their choices_key, a slot keeps its cursor while the key stays the same
+        self.dye_cursors: dict[str, tuple[tuple, ChoiceCursor]] = {}
+        self.dye_solves = Counter()
+
+        self.create_widgets()
+        self.tab_control.bind("<<NotebookTabChanged>>", self.on_tab_changed)
+
+        selections = [f"{slot}_selected" for slot in SLOTS]
+        self.view_state.view("color_palette", self.update_color_palette, "color_currently_selected", "dye_strength", *selections)
+        self.view_state.view("value_slider", self.update_value_slider, "color_currently_selected", *selections)
+        self.view_state.view("item_grid", self.update_tab_control_list, "current_tab", "color_currently_selected", "dye_strength", "show_only_dyeable", *selections)
+        self.view_state.view("character_display", self.update_character_display, *(f"{slot}_img_path" for slot in SLOTS), "hat_selected")
+        self.view_state.view("clothing_ingredients", self.update_clothing_ingredients, *selections)
+        self.view_state.view("color_ingredients", self.update_color_ingredients, *(f"{slot}_{name}" for slot in SLOTS for name in ("selected", "color", "strength")))
+        self.view_state.refresh()
+
+        self.record_startup_time("init")
+        # Idle callbacks only run once the pending map/draw events are handled, i.e. the window is on screen
+        self.after_idle(self.record_startup_time, "first_frame")
+
+    def record_startup_time(self, name):
+        self.startup_times[name] = time.perf_counter() - self.startup_started
+
+    def destroy(self):
+        if tracing.ENABLED:
+            print(f"View refreshes: {self.view_state.stats()}, dye solves: {dict(self.dye_solves)}", file=sys.stderr)
+        self.jobs.shutdown()
+        variant_provider.close()
+        super().destroy()
+
+    def load_images(self, key, paths: list[Path], then):
+        """Tints/downloads the images in the background and calls then() once they are available"""
+        paths = [path for path in paths if path not in variant_provider.failed]
+        if paths:
+            self.jobs.submit(key, self._make_images, paths, on_done=lambda _: then())
+
+    @staticmethod
+    def _make_images(paths: list[Path]):
+        for path in paths:
+            try:
+                variant_provider.get(path)
+            except Exception as e:
+                print(f"Failed to load {path}: {e}")
 
     def create_widgets(self):
         # Top left: Character Portrait
@@ -63,13 +294,14 @@ class CharacterCreator(tk.Tk):
 
         # Add a grid of tailorable items to each page in the notebook
         self.notebook_page = tk.Canvas(self.tab_control, width=480, height=240)
-        self.notebook_page_frame = tk.Frame(self.notebook_page)
         self.notebook_page_scrollbar = tk.Scrollbar(self.tab_control, orient="vertical", command=self.notebook_page.yview)
-        self.notebook_page.configure(yscrollcommand=self.notebook_page_scrollbar.set)
+        self.item_grid = VirtualItemGrid(
+            self.notebook_page, self.notebook_page_scrollbar, self.select_item,
+            lambda paths: self.load_images("grid_images", paths, self.item_grid.refresh),
+        )
 
         self.notebook_page_scrollbar.grid(row=0, column=1, padx=(0,10), pady=10, sticky="ns")
         self.notebook_page.grid(row=0, column=0, padx=10, pady=42, sticky="nsew")
-        self.notebook_page.create_window((0, 0), window=self.notebook_page_frame, anchor="nw")
 
         # Middle left: Color Palette
         self.color_palette = tk.Frame(self)
@@ -86,7 +318,7 @@ class CharacterCreator(tk.Tk):
 
         # Under the notebook page: Show only dyeable items checkbox
         self.show_only_dyeable_var = tk.IntVar()
-        self.show_only_dyeable_checkbox = tk.Checkbutton(self.bottom_frame, text="Show only dyeable items", variable=self.show_only_dyeable_var, command=self.update_tab_control_list)
+        self.show_only_dyeable_checkbox = tk.Checkbutton(self.bottom_frame, text="Show only dyeable items", variable=self.show_only_dyeable_var, command=self.on_show_only_dyeable_changed)
         self.show_only_dyeable_checkbox.grid(row=0, column=0, padx=10, pady=10)
 
 
@@ -103,6 +335,7 @@ class CharacterCreator(tk.Tk):
         self.color_ingredients_frame.grid(row=1, column=1, padx=10, pady=10)
 
         tk.Label(self.color_ingredients_frame, text="Color Ingredients").pack()
+        tk.Button(self.color_ingredients_frame, text="Cheapest plan", command=self.select_cheapest_plan).pack()
         self.color_ingredients_list = tk.Frame(self.color_ingredients_frame, height=10)
         self.color_ingredients_list.pack(fill=tk.X, expand=True)
 
@@ -116,8 +349,8 @@ class CharacterCreator(tk.Tk):
         self.character_image = self.character_image.zoom(4, 4)
 
         self.character_canvas.create_image(150, 200, image=self.character_image)
-
-        self.update_color_palette()
+        # The whole outfit is one image on top of the portrait, swapped out on every redraw
+        self.outfit_display = self.character_canvas.create_image(0, 0, anchor="nw")
 
         self.value_slider.set(0)
         
@@ -128,31 +361,128 @@ class CharacterCreator(tk.Tk):
         self.value_slider.bind("<ButtonRelease-1>", self.update_tab_control_list_and_character_display)
 
     def update_color_palette(self):
-        columns = 11
-        for i, color in enumerate(dyeing_info):
-            r, g, b = dyeing_info[color]["rgb"]
-            color_button = tk.Button(self.color_palette, bg=f"#{r:02x}{g:02x}{b:02x}", width=2, height=1, command=lambda color=color: self.select_color(color))
-            color_button.grid(row=i // columns, column=i % columns, padx=5, pady=5)
+        # The buttons are made once, after that only the sunken one changes
+        if not self.color_palette.winfo_children():
+            columns = 11
+            table = get_dye_table()
+            for i, color in enumerate(table.color_names):
+                r, g, b = table.rgb[i].tolist()
+                color_button = tk.Button(self.color_palette, bg=f"#{r:02x}{g:02x}{b:02x}", width=2, height=1, command=lambda color=color: self.select_color(color))
+                color_button.grid(row=i // columns, column=i % columns, padx=5, pady=5)
+                color_button.color = color
+
+        # Colors that can't be made at the chosen strength (even with the outfit's ingredients) can't be picked
+        favour = self.calculate_clothing_ingredients()
+        for color_button in self.color_palette.winfo_children():
+            makeable = self.dye_strength == 0 or can_make(color_button.color, self.dye_strength, favour)
+            color_button.config(
+                relief=tk.SUNKEN if color_button.color == self.color_currently_selected else tk.RAISED,
+                state=tk.NORMAL if makeable else tk.DISABLED,
+            )
+
+    def update_value_slider(self):
+        # The slider stops at the strongest the selected color can be made at
+        color = self.color_currently_selected
+        strongest = MAX_STRENGTH if color is None else max(makeable_strengths(color, self.calculate_clothing_ingredients()), default=0)
+        self.value_slider.config(to=strongest)
+
+        # A new color or outfit can leave the slider (and what each garment is dyed at) at a strength
+        # that can't be made anymore, those snap to the closest one that can
+        strength = self.makeable_strength(self.dye_strength)
+        if strength != self.dye_strength:
+            self.dye_strength = strength
+            self.value_slider.set(strength)
+        for slot in SLOTS:
+            selected, color, strength = getattr(self, f"{slot}_selected"), getattr(self, f"{slot}_color"), getattr(self, f"{slot}_strength")
+            img_path = getattr(self, f"{slot}_img_path")
+            if selected is None or not selected.dyeable or color is None or img_path is None:
+                continue
+            makeable = self.makeable_strength(strength, color)
+            if makeable != strength:
+                setattr(self, f"{slot}_strength", makeable)
+                setattr(self, f"{slot}_img_path", img_path.parent / (f"{color}_{makeable}.png" if makeable > 0 else "original.png"))
+
+    def makeable_strength(self, strength: int, color: str | None = None) -> int:
+        """The strength closest to this one (the weaker one on a tie) that the color (the selected one by default) can be made at"""
+        if color is None:
+            color = self.color_currently_selected
+        favour = self.calculate_clothing_ingredients()
+        if color is None or strength == 0 or can_make(color, strength, favour):
+            return strength
+        return min(makeable_strengths(color, favour), key=lambda makeable: (abs(makeable - strength), makeable), default=0)
+
+    def on_tab_changed(self, event=None):
+        self.current_tab = self.tab_control.tab(self.tab_control.select(), "text").lower()
+
+        if self.item_currently_selected and self.current_tab != self.item_currently_selected.type:
+            self.item_currently_selected = None
+        elif self.shirt_selected and self.current_tab == "shirt":
+            self.item_currently_selected = self.shirt_selected
+        elif self.pants_selected and self.current_tab == "pants":
+            self.item_currently_selected = self.pants_selected
+        elif self.hat_selected and self.current_tab == "hat":
+            self.item_currently_selected = self.hat_selected
+        self.view_state.refresh()
 
-            if self.color_currently_selected == color:
-                color_button.config(relief=tk.SUNKEN)
+    def on_show_only_dyeable_changed(self):
+        self.show_only_dyeable = bool(self.show_only_dyeable_var.get())
+        self.view_state.refresh()
 
+    @traced
     def update_tab_control_list_and_character_display(self, event=None):
-        tab_name = self.tab_control.tab(self.tab_control.select(), "text").lower()
-        if self.shirt_selected is not None and tab_name == "shirt":
+        """Dyes the garment of the open tab with the selected color and strength, and redraws what that changed"""
+        # Stops in between that the color can't be made at snap to the closest one it can
+        self.dye_strength = self.makeable_strength(self.value_slider.get())
+        if self.dye_strength != self.value_slider.get():
+            self.value_slider.set(self.dye_strength)
+        if self.shirt_selected is not None and self.current_tab == "shirt":
             self.item_currently_selected = self.shirt_selected
-        elif self.pants_selected is not None and tab_name == "pants":
+        elif self.pants_selected is not None and self.current_tab == "pants":
             self.item_currently_selected = self.pants_selected
-        elif self.hat_selected is not None and tab_name == "hat":
+        elif self.hat_selected is not None and self.current_tab == "hat":
             self.item_currently_selected = self.hat_selected
 
+        if self.item_currently_selected is not None:
+            self.set_selection_image(self.item_currently_selected.type)
+        self.view_state.refresh()
 
-        self.set_selection_image(self.item_currently_selected.type)
-        self.update_tab_control_list()
-        self.update_character_display()
+    def update_clothing_ingredients(self):
         self.current_clothing_ingredients_requirements = self.calculate_clothing_ingredients()
         self.update_clothing_ingredients_list()
-        self.current_color_ingredients_requirements = self.calculate_color_ingredients()
+
+    def update_color_ingredients(self):
+        """
+        Solves the dyes of the slots whose color, strength or favoured ingredients changed. The other
+        slots keep their cursor, so their rows stay on the choice they were showing.
+        """
+        favour = list(self.current_clothing_ingredients_requirements)
+        targets = self.calculate_dye_targets_by_slot()
+        keys = {slot: choices_key(color, strength, favour) for slot, (color, strength) in targets.items()}
+        cursors = {slot: cursor for slot, (key, cursor) in self.dye_cursors.items() if keys.get(slot) == key}
+        stale = [slot for slot in keys if slot not in cursors]
+        self.dye_solves["reused"] += len(cursors)
+        self.dye_solves["solved"] += len(stale)
+
+        # Whatever is still being solved or planned was for rows that have changed since
+        self.jobs.cancel("plan")
+        self.jobs.cancel("color_ingredients")
+        if not stale and list(keys) == list(self.dye_cursors):
+            self.dye_solves["rows_kept"] += 1
+            return
+
+        def solved(new_cursors):
+            cursors.update(zip(stale, new_cursors))
+            self.dye_cursors = {slot: (keys[slot], cursors[slot]) for slot in keys}
+            self.show_color_ingredients([cursors[slot] for slot in keys])
+
+        if stale:
+            # Solve in the background, a newer change (e.g. the slider moving again) supersedes this one
+            self.jobs.submit("color_ingredients", first_choices, [targets[slot] for slot in stale], favour, on_done=solved)
+        else:
+            solved([])
+
+    def show_color_ingredients(self, requirements: list[ChoiceCursor]):
+        self.current_color_ingredients_requirements = requirements
         self.update_color_ingredients_list()
 
 
@@ -166,51 +496,70 @@ class CharacterCreator(tk.Tk):
             ingredients.extend(self.hat_selected.ingredients)
         return ingredients
     
-    def calculate_color_ingredients(self) -> list[list[IngredientCombination]]:
-        """Returns a list of choices. These are all the choices you need to make the dyes for your current outfit"""
-        ingredients = []
+    def calculate_dye_targets(self) -> list[tuple[str, int]]:
+        """The (color, strength) of every garment in the outfit that is being dyed"""
+        return list(self.calculate_dye_targets_by_slot().values())
+
+    def calculate_dye_targets_by_slot(self) -> dict[str, tuple[str, int]]:
+        targets = {}
         if self.shirt_color and self.shirt_selected.dyeable:
-            ingredients.append(get_ingredients_choices(self.shirt_color, self.shirt_strength, favour=self.current_clothing_ingredients_requirements))
+            targets["shirt"] = (self.shirt_color, self.shirt_strength)
         if self.pants_color and self.pants_selected.dyeable:
-            ingredients.append(get_ingredients_choices(self.pants_color, self.pants_strength, favour=self.current_clothing_ingredients_requirements))
+            targets["pants"] = (self.pants_color, self.pants_strength)
         if self.hat_color and self.hat_selected.dyeable:
-            ingredients.append(get_ingredients_choices(self.hat_color, self.hat_strength, favour=self.current_clothing_ingredients_requirements))
-        return ingredients
+            targets["hat"] = (self.hat_color, self.hat_strength)
+        return targets
+
+    def select_cheapest_plan(self):
+        """Points every row of color ingredients at the choices of the cheapest plan for the whole outfit"""
+        if self.jobs.pending("color_ingredients"):
+            # The rows are about to be replaced, a plan for the current ones would be stale
+            return
+        requirements = self.current_color_ingredients_requirements
+        self.jobs.submit(
+            "plan", plan_outfit, self.calculate_dye_targets(), list(self.current_clothing_ingredients_requirements), None, 1, NEW_INGREDIENT_COST,
+            on_done=lambda plans: self.show_plan(plans, requirements),
+        )
+
+    def show_plan(self, plans, requirements: list[ChoiceCursor]):
+        if not plans or requirements is not self.current_color_ingredients_requirements:
+            return
+
+        # There is only a plan if every garment has choices, so the rows line up with the plan's choices
+        for requirement, choice in zip(requirements, plans[0].choices):
+            requirement.seek(requirement.index_of(choice))
+        self.update_color_ingredients_list()
     
+    @traced
     def update_clothing_ingredients_list(self):
         # Clear the current list of ingredients
         for widget in self.clothing_ingredients_list.winfo_children():
             widget.destroy()
         
+        missing = []
         for ingredient in self.current_clothing_ingredients_requirements:
             row = tk.Frame(self.clothing_ingredients_list)
             icon_img_path = Path(CWD / "images" / "ingredients" / (sanitize_name(ingredient.name) + ".png"))
-            icon_img = tk.PhotoImage(file=icon_img_path)
+            icon_img = image_cache.get(icon_img_path)
+            if icon_img is None:
+                missing.append(icon_img_path)
             label = tk.Label(row, text=ingredient.name, image=icon_img, compound=tk.LEFT, anchor=tk.W)
             label.image = icon_img
             label.pack(side=tk.LEFT)
             row.pack()
 
+        if missing:
+            self.load_images("clothing_icons", missing, self.update_clothing_ingredients_list)
+
     def increase_choice_index(self, row_number):
-        if row_number not in self.choice_indices:
-            self.choice_indices[row_number] = 0
-        self.choice_indices[row_number] += 1
+        self.current_color_ingredients_requirements[row_number].next()
         self.update_color_ingredients_list()
 
     def decrease_choice_index(self, row_number):
-        if row_number not in self.choice_indices:
-            self.choice_indices[row_number] = 0
-        self.choice_indices[row_number] -= 1
+        self.current_color_ingredients_requirements[row_number].prev()
         self.update_color_ingredients_list()
 
-    def get_choice_index(self, row_number):
-        if row_number not in self.choice_indices:
-            self.choice_indices[row_number] = 0
-        return self.choice_indices[row_number]
-    
-    def reset_choice_indices(self):
-        self.choice_indices = {}
-
+    @traced
     def update_color_ingredients_list(self):
         # Clear the current list of ingredients
         for widget in self.color_ingredients_list.winfo_children():
@@ -220,10 +569,11 @@ class CharacterCreator(tk.Tk):
         # e.g. 2x🎃 + 🍎
         # There will be several ways to make the same color, so there are left and right arrows to scroll through the choices
 
+        missing = []
         for row_number, requirement in enumerate(self.current_color_ingredients_requirements):
-            requirement = list(requirement)
-            if len(requirement) <= 0:
-                row_number -= 1
+            # Only the current choice is needed to draw the row
+            ingredient_combination = requirement.current()
+            if ingredient_combination is None:
                 continue
 
             row = tk.Frame(self.color_ingredients_list)  
@@ -231,10 +581,6 @@ class CharacterCreator(tk.Tk):
             tk.Button(row, text="<", command=lambda row_number=row_number: self.increase_choice_index(row_number)).pack(side=tk.LEFT)
 
             # Show the current choice
-            choice_index = self.get_choice_index(row_number)
-            
-            ingredient_combination = requirement[choice_index % len(requirement)]
-
             num_combos = len(ingredient_combination.combination)
             worded_label_text = " ("
             for combo_number ,combo in enumerate(ingredient_combination.combination):
@@ -244,7 +590,9 @@ class CharacterCreator(tk.Tk):
                     qty_label = tk.Label(row, text=f"{combo[1]}x")
                 
                 icon_img_path = Path(CWD / "images" / "ingredients" / (sanitize_name(combo[0].name) + ".png"))
-                icon_img = tk.PhotoImage(file=icon_img_path)
+                icon_img = image_cache.get(icon_img_path)
+                if icon_img is None:
+                    missing.append(icon_img_path)
                 icon_label = tk.Label(row, text="", image=icon_img, compound=tk.LEFT, anchor=tk.W)
                 icon_label.image = icon_img
 
@@ -261,69 +609,43 @@ class CharacterCreator(tk.Tk):
 
             tk.Label(row, text=worded_label_text + ")", anchor=tk.W).pack(side=tk.LEFT)
 
-            tk.Button(row, text=">", command=lambda row_number=row_number: self.decrease_choice_index(row_number)).pack(side=tk.LEFT)
+            # There is nothing before the first choice (see ChoiceCursor.prev)
+            tk.Button(row, text=">", state=tk.NORMAL if requirement.index > 0 else tk.DISABLED, command=lambda row_number=row_number: self.decrease_choice_index(row_number)).pack(side=tk.LEFT)
             
 
             row.pack()
 
+        if missing:
+            self.load_images("color_icons", missing, self.update_color_ingredients_list)
+
     def select_color(self, color):
         if self.value_slider.get() == 0:
             self.value_slider.set(25)
 
         self.color_currently_selected = color
-        if self.item_currently_selected:
-            self.set_selection_image(self.item_currently_selected.type)
         self.update_tab_control_list_and_character_display()
-        self.update_color_palette()
-
-    def update_tab_control_list(self, event=None):
-        tab_label = self.tab_control.tab(self.tab_control.select(), "text")
-        tab_name = tab_label.lower()
-
-        self.reset_choice_indices()
-        
-        if self.item_currently_selected and tab_name != self.item_currently_selected.type:
-            self.item_currently_selected = None
-        elif self.shirt_selected and tab_name == "shirt":
-            self.item_currently_selected = self.shirt_selected
-        elif self.pants_selected and tab_name == "pants":
-            self.item_currently_selected = self.pants_selected
-        elif self.hat_selected and tab_name == "hat":
-            self.item_currently_selected = self.hat_selected
 
-        # Clear the current list of items
-        for widget in self.notebook_page_frame.winfo_children():
-            widget.destroy()
+    @traced
+    def update_tab_control_list(self):
+        tab_name = self.current_tab
 
         # Scrollable grid of selectable tailorable items (icon + name) based on tab selection
-        itemno = -1
-        for item in tailoring_data:
-            if self.show_only_dyeable_var.get() and not item.dyeable:
+        selected = {"shirt": self.shirt_selected, "pants": self.pants_selected, "hat": self.hat_selected}.get(tab_name)
+        entries = []
+        for item in get_tailoring_data():
+            if self.show_only_dyeable and not item.dyeable:
                 continue
 
             if item.type == tab_name:
-                itemno += 1
                 variant = "original.png"
-                if item.dyeable and self.color_currently_selected is not None and self.value_slider.get() > 0:
-                    variant = self.color_currently_selected + "_" + str(self.value_slider.get()) + ".png"
+                if item.dyeable and self.color_currently_selected is not None and self.dye_strength > 0:
+                    variant = self.color_currently_selected + "_" + str(self.dye_strength) + ".png"
 
                 icon_img_path = Path(CWD / "images" / item.type / sanitize_name(item.name) / variant)
-                icon_img = tk.PhotoImage(file=icon_img_path)
-                icon_img = icon_img.zoom(2, 2)
-                button = tk.Button(self.notebook_page_frame, text=item.name, image=icon_img, compound=tk.TOP, command=lambda item=item: self.select_item(item))
-                button.image = icon_img
-                columns = 4
-                button.grid(row=itemno // columns, column=itemno % columns, padx=5, pady=5)
-
-                if item.type == "shirt" and self.shirt_selected == item:
-                    button.config(relief=tk.SUNKEN)
-                elif item.type == "pants" and self.pants_selected == item:
-                    button.config(relief=tk.SUNKEN)
-                elif item.type == "hat" and self.hat_selected == item:
-                    button.config(relief=tk.SUNKEN)
-
-        self.notebook_page_frame.update_idletasks()
-        self.notebook_page.config(scrollregion=self.notebook_page.bbox("all"))
+                entries.append((item, icon_img_path, selected is not None and selected == item))
+
+        # Only the rows in view get (recycled) buttons, and only their images are loaded
+        self.item_grid.set_items(entries)
 
     def select_item(self, item: TailoringItem):
         if item.type == "shirt":
@@ -334,48 +656,49 @@ class CharacterCreator(tk.Tk):
             self.hat_selected = item
         self.item_currently_selected = item
 
-        self.set_selection_image(item.type)
         self.update_tab_control_list_and_character_display()
 
     def set_selection_image(self, type):
         if self.item_currently_selected is not None:
             variant = "original.png"
-            strength = self.value_slider.get()
+            strength = self.dye_strength
             if self.item_currently_selected.dyeable and self.color_currently_selected is not None and strength > 0:
                 variant = self.color_currently_selected + "_" + str(strength) + ".png"
 
             img_path = Path(CWD / "images" / type / sanitize_name(self.item_currently_selected.name) / variant)
-            img = tk.PhotoImage(file=img_path)
-            img = img.zoom(4, 4)
 
             if type == "shirt":
-                self.shirt_img = img
                 self.shirt_strength = strength
                 self.shirt_color = self.color_currently_selected
+                self.shirt_img_path = img_path
             elif type == "pants":
-                self.pants_img = img
                 self.pants_strength = strength
                 self.pants_color = self.color_currently_selected
+                self.pants_img_path = img_path
             elif type == "hat":
-                self.hat_img = img
                 self.hat_strength = strength
                 self.hat_color = self.color_currently_selected
+                self.hat_img_path = img_path
 
+    @traced
     def update_character_display(self):
-        # Combine the images
-        if self.shirt_img is not None:
-            self.shirt_display = self.character_canvas.create_image(150, 220, image=self.shirt_img)
-        if self.pants_img is not None:
-            self.pants_display = self.character_canvas.create_image(150, 242, image=self.pants_img)
-        if self.hat_img is not None:
-            hat_y = 168 if self.hat_selected.hat_high else 176
-            self.hat_display = self.character_canvas.create_image(150, hat_y, image=self.hat_img)
-       
-        self.character_canvas.update()
+        # Combine the images in the background, a newer redraw supersedes this one.
+        # Whether a hat sits high isn't on the wiki, so only items that say so are drawn higher.
+        hat_high = getattr(self.hat_selected, "hat_high", False)
+        self.jobs.submit(
+            "character_display", self.outfit_renderer.compose, self.shirt_img_path, self.pants_img_path, self.hat_img_path, hat_high,
+            on_done=self.show_outfit,
+        )
+
+    @traced
+    def show_outfit(self, outfit):
+        # Keep a reference to the image or Tk shows nothing, the previous one can then be freed
+        self.outfit_photo = ImageTk.PhotoImage(outfit)
+        self.character_canvas.itemconfig(self.outfit_display, image=self.outfit_photo)
 
 
 if __name__ == '__main__':
-    download_images()
+    # Images are downloaded and tinted as they come into view, run download_images.py to do them all up front
 
     # Start the GUI
     app = CharacterCreator()
@@ -0,0 +1,120 @@
+from dataclasses import dataclass, field
+import heapq
+import itertools
+from items import IngredientItem, IngredientCombination, ingredient_registry
+from dyeing import get_ingredients_choices, get_dye_table
+
+# The ingredient_type_cost the GUI and plan_outfits.py use: every extra kind of ingredient to gather
+# counts as much as one more item
+NEW_INGREDIENT_COST = 1.0
+
+
+@dataclass(order=True)
+class OutfitPlan:
+    cost: float
+    # One choice per (color, strength) target, in the order the targets were given
+    choices: tuple[IngredientCombination, ...] = field(compare=False)
+    # Everything to gather for the outfit (clothing and dye ingredients), as item counts
+    shopping_list: dict[IngredientItem, int] = field(compare=False)
+
+    def __str__(self):
+        return ", ".join(f"{count}x {ingredient.name}" for ingredient, count in self.shopping_list.items())
+
+
+def plan_outfit(
+    targets: list[tuple[str, int]],
+    clothing_ingredients: list[IngredientItem],
+    costs: dict[str, float] | None = None,
+    k: int = 5,
+    ingredient_type_cost: float = 0.0,
+) -> list[OutfitPlan]:
+    """
+    Finds the k cheapest ways to dye a whole outfit. targets is one (color, strength) per garment
+    that is being dyed, clothing_ingredients what the garments themselves are made from.
+
+    A plan costs costs[name] (1 by default, i.e. the number of items) for every ingredient item in
+    it, plus ingredient_type_cost for every distinct kind of ingredient on the shopping list. That
+    second part is only paid once per ingredient, so plans that reuse the same ingredient across
+    garments (or one the clothing already needs) come out cheaper.
+
+    This is a branch and bound over the garments: each garment's choices are tried cheapest first
+    and a branch is dropped as soon as it can't beat the k-th best plan found so far, so only a tiny
+    part of the cross product of choices is ever looked at.
+    """
+    if costs is None:
+        costs = {}
+    table = get_dye_table()
+
+    def item_cost(id_):
+        return costs.get(ingredient_registry[id_].name, 1.0)
+
+    # What the clothing needs is bought anyway
+    base_counts: dict[int, int] = {}
+    for ingredient in clothing_ingredients:
+        id_ = ingredient_registry.id(ingredient)
+        base_counts[id_] = base_counts.get(id_, 0) + 1
+    base_cost = sum(item_cost(id_) * count for id_, count in base_counts.items()) + ingredient_type_cost * len(base_counts)
+
+    # Per garment, every choice as (cost of its items, {ingredient ID: item count}, choice), cheapest first
+    garments = []
+    for color, strength in targets:
+        units = table.units[table.color_indices[color]]
+        candidates = []
+        for choice in get_ingredients_choices(color, strength, favour=clothing_ingredients):
+            # Quantities are in dye strength units, turn them back into how many of each item is needed
+            counts = {id_: quantity // int(units[id_]) for id_, quantity in zip(choice.ids, choice.quantities)}
+            candidates.append((sum(item_cost(id_) * count for id_, count in counts.items()), counts, choice))
+        if not candidates:
+            return []
+        candidates.sort(key=lambda candidate: candidate[0])
+        garments.append(candidates)
+
+    # Lower bound for the garments after i: their cheapest choices, ignoring the ingredient type costs
+    bound_after = [0.0] * (len(garments) + 1)
+    for i in range(len(garments) - 1, -1, -1):
+        bound_after[i] = bound_after[i + 1] + garments[i][0][0]
+
+    # Max-heap (by negated cost) of the best k plans found so far, the counter breaks ties on insertion order
+    best: list[tuple[float, int, tuple, dict[int, int]]] = []
+    tie_breaker = itertools.count()
+
+    def kth_best_cost():
+        return -best[0][0] if len(best) >= k else float("inf")
+
+    def search(i, cost, counts: dict[int, int], chosen: list[IngredientCombination]):
+        if i == len(garments):
+            entry = (-cost, -next(tie_breaker), tuple(chosen), dict(counts))
+            if len(best) < k:
+                heapq.heappush(best, entry)
+            else:
+                heapq.heappushpop(best, entry)
+            return
+
+        for choice_cost, choice_counts, choice in garments[i]:
+            # The choices are sorted, so once one can't make the cut none of the rest can either
+            if cost + choice_cost + bound_after[i + 1] >= kth_best_cost():
+                break
+
+            new_types = sum(1 for id_ in choice_counts if id_ not in counts)
+            new_cost = cost + choice_cost + ingredient_type_cost * new_types
+            if new_cost + bound_after[i + 1] >= kth_best_cost():
+                continue
+
+            for id_, count in choice_counts.items():
+                counts[id_] = counts.get(id_, 0) + count
+            chosen.append(choice)
+            search(i + 1, new_cost, counts, chosen)
+            chosen.pop()
+            for id_, count in choice_counts.items():
+                counts[id_] -= count
+                if counts[id_] == 0:
+                    del counts[id_]
+
+    search(0, base_cost, dict(base_counts), [])
+
+    # Cheapest first, and among equally cheap plans the one found first (the most favoured choices)
+    best.sort(key=lambda entry: (-entry[0], -entry[1]))
+    return [
+        OutfitPlan(-negative_cost, chosen, {ingredient_registry[id_]: count for id_, count in counts.items()})
+        for negative_cost, _, chosen, counts in best
+    ]
@@ -0,0 +1,56 @@
+from pathlib import Path
+from collections import OrderedDict
+from PIL import Image
+from sprite_atlas import open_sprite
+
+# Size of the character canvas, and how much the garment sprites are blown up on it
+CANVAS_SIZE = (320, 320)
+ZOOM = 4
+
+# Where the center of each garment goes on the canvas
+SHIRT_CENTER = (150, 220)
+PANTS_CENTER = (150, 242)
+HAT_CENTER = (150, 176)
+HAT_HIGH_CENTER = (150, 168)
+
+
+def hat_center(hat_high: bool) -> tuple[int, int]:
+    """Some hats sit higher on the head than others"""
+    return HAT_HIGH_CENTER if hat_high else HAT_CENTER
+
+
+class OutfitRenderer:
+    """
+    Composites the shirt, pants and hat of an outfit into a single transparent image the size of the
+    character canvas, so the canvas only ever needs one image item for the whole outfit. Only uses
+    PIL, so it can run off the Tk main thread. The zoomed sprites are kept around (the last
+    max_layers of them) as the same garments are redrawn over and over. load_sprite turns a path
+    into an RGBA image.
+    """
+    def __init__(self, max_layers: int = 32, load_sprite=open_sprite):
+        self.load_sprite = load_sprite
+        self.max_layers = max_layers
+        self.layers: OrderedDict[Path, Image.Image] = OrderedDict()
+
+    def layer(self, path: Path) -> Image.Image:
+        layer = self.layers.get(path)
+        if layer is not None:
+            self.layers.move_to_end(path)
+            return layer
+
+        sprite = self.load_sprite(path)
+        layer = sprite.resize((sprite.width * ZOOM, sprite.height * ZOOM), Image.NEAREST)
+        self.layers[path] = layer
+        while len(self.layers) > self.max_layers:
+            self.layers.popitem(last=False)
+        return layer
+
+    def compose(self, shirt_path: Path | None, pants_path: Path | None, hat_path: Path | None, hat_high: bool = False) -> Image.Image:
+        outfit = Image.new("RGBA", CANVAS_SIZE)
+        # Drawn in this order, the hat goes over everything
+        for path, (x, y) in ((shirt_path, SHIRT_CENTER), (pants_path, PANTS_CENTER), (hat_path, hat_center(hat_high))):
+            if path is None:
+                continue
+            layer = self.layer(path)
+            outfit.alpha_composite(layer, (x - layer.width // 2, y - layer.height // 2))
+        return outfit
@@ -0,0 +1,120 @@
+"""
+Checks that the wiki parsers give the same data with wiki.parse_tables (only the matching tables
+are built, with lxml or html.parser) as with the original way of parsing a page: the whole document
+with html.parser, then find_all("table"). Both pages in fixtures/wiki are parsed both ways, with
+each parser parse_tables can use, and the tailoring items and dyeing_info compared field by field.
+
+    python parser_check.py
+"""
+from dataclasses import fields
+from pathlib import Path
+import contextlib
+import io
+import sys
+
+CWD = Path(__file__).parent
+
+WIKI_DIR = CWD / "fixtures" / "wiki"
+
+PARSERS = ("lxml", "html.parser")
+
+
+def full_document_tables(html: str, class_: str):
+    """parse_tables as it was: the whole page as a tree, then its tables with the class"""
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, "html.parser").find_all("table", class_=class_)
+
+
+@contextlib.contextmanager
+def patched(module, name, value):
+    old = getattr(module, name)
+    setattr(module, name, value)
+    try:
+        yield
+    finally:
+        setattr(module, name, old)
+
+
+def parse_pages(parse_tables=None, parser=None):
+    """The tailoring items and dyeing_info of the fixture pages, with another parse_tables or parser"""
+    import dyeing
+    import tailoring
+    import wiki
+
+    with contextlib.ExitStack() as stack:
+        if parse_tables is not None:
+            stack.enter_context(patched(tailoring, "parse_tables", parse_tables))
+            stack.enter_context(patched(dyeing, "parse_tables", parse_tables))
+        if parser is not None:
+            stack.enter_context(patched(wiki, "html_parser", lambda: parser))
+        stack.enter_context(contextlib.redirect_stdout(io.StringIO()))
+
+        tailoring_data = tailoring._parse_tailoring_page((WIKI_DIR / "Tailoring.html").read_text(encoding="utf-8"))
+        dyeing_info = dyeing._parse_dyeing_page((WIKI_DIR / "Dyeing.html").read_text(encoding="utf-8"))
+    return tailoring_data, dyeing_info
+
+
+def compare_items(where: str, got, expected) -> list[str]:
+    """Differences between two dataclass instances (of the same type), field by field"""
+    differences = []
+    for field in fields(expected):
+        got_value, expected_value = getattr(got, field.name), getattr(expected, field.name)
+        if field.name == "ingredients" and got_value is not None and expected_value is not None:
+            if len(got_value) != len(expected_value):
+                differences.append(f"{where}: {len(got_value)} ingredients instead of {len(expected_value)}")
+                continue
+            for i, (got_ingredient, expected_ingredient) in enumerate(zip(got_value, expected_value)):
+                differences.extend(compare_items(f"{where} ingredient {i}", got_ingredient, expected_ingredient))
+        elif got_value != expected_value:
+            differences.append(f"{where} {field.name}: {got_value!r} instead of {expected_value!r}")
+    return differences
+
+
+def compare(got, expected) -> list[str]:
+    got_tailoring, got_dyeing = got
+    expected_tailoring, expected_dyeing = expected
+
+    differences = []
+    if len(got_tailoring) != len(expected_tailoring):
+        differences.append(f"{len(got_tailoring)} tailoring items instead of {len(expected_tailoring)}")
+    for i, (got_item, expected_item) in enumerate(zip(got_tailoring, expected_tailoring)):
+        differences.extend(compare_items(f"tailoring item {i} ({expected_item.name})", got_item, expected_item))
+
+    if list(got_dyeing) != list(expected_dyeing):
+        differences.append(f"colors {list(got_dyeing)} instead of {list(expected_dyeing)}")
+    for color in expected_dyeing.keys() & got_dyeing.keys():
+        if got_dyeing[color]["rgb"] != expected_dyeing[color]["rgb"]:
+            differences.append(f"{color} rgb: {got_dyeing[color]['rgb']} instead of {expected_dyeing[color]['rgb']}")
+        got_ingredients = list(got_dyeing[color]["ingredients"].items())
+        expected_ingredients = list(expected_dyeing[color]["ingredients"].items())
+        if len(got_ingredients) != len(expected_ingredients):
+            differences.append(f"{color}: {len(got_ingredients)} ingredients instead of {len(expected_ingredients)}")
+        for i, ((got_ingredient, got_strength), (expected_ingredient, expected_strength)) in enumerate(zip(got_ingredients, expected_ingredients)):
+            differences.extend(compare_items(f"{color} ingredient {i}", got_ingredient, expected_ingredient))
+            if got_strength != expected_strength:
+                differences.append(f"{color} ingredient {i} ({expected_ingredient.name}) strength: {got_strength} instead of {expected_strength}")
+    return differences
+
+
+def main():
+    import importlib.util
+
+    expected = parse_pages(parse_tables=full_document_tables)
+    print(f"The full documents have {len(expected[0])} tailoring items and {len(expected[1])} colors")
+
+    failed = False
+    for parser in PARSERS:
+        if parser == "lxml" and importlib.util.find_spec("lxml") is None:
+            # It is optional, parse_tables falls back to html.parser without it
+            print(f"parse_tables with {parser}: skipped, it isn't installed")
+            continue
+        differences = compare(parse_pages(parser=parser), expected)
+        for difference in differences:
+            print(f"FAIL: with {parser}, {difference}")
+        print(f"parse_tables with {parser}: {'the same' if not differences else f'{len(differences)} differences'}")
+        failed = failed or bool(differences)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,200 @@
+"""
+Works out dye plans for many outfits without the GUI. Reads one outfit per line (JSONL) from the
+given files or stdin and writes one result per line to stdout (or -o), in the same order:
+
+    {"id": "ada", "shirt": {"item": "Sailor Shirt", "color": "red", "strength": 50}, "hat": {"item": "Cowboy Hat"}}
+
+    {"id": "ada", "clothing_ingredients": [...], "slots": {"shirt": {..., "choices": [...]}, ...}, "plan": {...}}
+
+Every slot (shirt, pants, hat) is optional and only needs a color and strength if it is dyed. A
+line that can't be planned gets {"id": ..., "error": "..."} instead. Outfits are solved on a pool
+of processes and only a bounded number of them is in flight at a time, so memory stays flat no
+matter how long the input is.
+
+    python plan_outfits.py outfits.jsonl -j 8 -o plans.jsonl
+"""
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+import argparse
+import contextlib
+import itertools
+import json
+import os
+import sys
+
+SLOTS = ("shirt", "pants", "hat")
+
+# How many outfits one task handles, and how many tasks per worker may be queued up at once
+BATCH_SIZE = 32
+BATCHES_IN_FLIGHT_PER_WORKER = 4
+
+# Choices listed per dyed slot in the output (the plan can use any of them, not just these)
+DEFAULT_CHOICES = 5
+
+_items_by_slot: dict[str, dict[str, object]] | None = None
+
+
+def _load():
+    """Looks up the items by slot and name, loading the wiki data on first use"""
+    global _items_by_slot
+    if _items_by_slot is None:
+        from tailoring import get_tailoring_data
+        from dyeing import get_dye_table
+        get_dye_table()
+        _items_by_slot = {slot: {} for slot in SLOTS}
+        for item in get_tailoring_data():
+            _items_by_slot[item.type][item.name.lower()] = item
+    return _items_by_slot
+
+
+def _init_worker():
+    # Whatever the solver prints must not end up in the JSONL output, which may be this stdout
+    sys.stdout = sys.stderr
+    _load()
+
+
+def plan_outfit_spec(spec: dict, choices: int = DEFAULT_CHOICES) -> dict:
+    """The result line for one outfit spec"""
+    from dyeing import STRENGTH_UNIT, get_dye_table, get_ingredients_choices
+    from items import ingredient_registry
+    from outfit_planner import NEW_INGREDIENT_COST, plan_outfit
+
+    items_by_slot = _load()
+    table = get_dye_table()
+    result = {"id": spec.get("id")}
+
+    selected = {}
+    for slot in SLOTS:
+        if spec.get(slot) is None:
+            continue
+        slot_spec = spec[slot]
+        if not isinstance(slot_spec, dict):
+            return {**result, "error": f"the {slot} must be a JSON object, not {slot_spec!r}"}
+        if not isinstance(slot_spec.get("item"), str):
+            return {**result, "error": f"the {slot} needs an item name, not {slot_spec.get('item')!r}"}
+        item = items_by_slot[slot].get(slot_spec["item"].lower())
+        if item is None:
+            return {**result, "error": f"unknown {slot} {slot_spec.get('item')!r}"}
+
+        color = slot_spec.get("color")
+        strength = slot_spec.get("strength")
+        if color is not None:
+            if not item.dyeable:
+                return {**result, "error": f"{item.name} can't be dyed"}
+            if color not in table.color_indices:
+                return {**result, "error": f"unknown color {color!r}"}
+            if not isinstance(strength, int) or not 0 < strength <= 100 or strength % STRENGTH_UNIT:
+                return {**result, "error": f"strength of the {slot} must be one of 25, 50, 75 or 100, not {strength!r}"}
+        selected[slot] = (item, color, strength)
+
+    clothing_ingredients = [ingredient for item, _, _ in selected.values() for ingredient in item.ingredients]
+
+    def counts(choice, color):
+        # Quantities are in dye strength units, as item counts they say how many of each to gather
+        units = table.units[table.color_indices[color]]
+        return [{"ingredient": ingredient_registry[id_].name, "count": quantity // int(units[id_])} for id_, quantity in zip(choice.ids, choice.quantities)]
+
+    slots = {}
+    targets = []
+    for slot, (item, color, strength) in selected.items():
+        slots[slot] = {"item": item.name}
+        if color is None:
+            continue
+        slots[slot].update(color=color, strength=strength)
+        slot_choices = get_ingredients_choices(color, strength, favour=clothing_ingredients)
+        if not slot_choices:
+            return {**result, "error": f"{color} at {strength}% can't be made"}
+        slots[slot]["choices"] = [counts(choice, color) for choice in slot_choices[:choices]]
+        slots[slot]["total_choices"] = len(slot_choices)
+        targets.append((color, strength))
+
+    result["clothing_ingredients"] = [ingredient.name for ingredient in clothing_ingredients]
+    result["slots"] = slots
+    plans = plan_outfit(targets, clothing_ingredients, k=1, ingredient_type_cost=NEW_INGREDIENT_COST)
+    if plans:
+        result["plan"] = {
+            "cost": plans[0].cost,
+            "shopping_list": [{"ingredient": ingredient.name, "count": count} for ingredient, count in plans[0].shopping_list.items()],
+        }
+    return result
+
+
+def plan_lines(lines: list[str], choices: int = DEFAULT_CHOICES) -> list[str]:
+    """Result lines for a batch of input lines (one task of the pool)"""
+    output = []
+    for line in lines:
+        try:
+            spec = json.loads(line)
+        except ValueError as e:
+            result = {"id": None, "error": f"invalid line: {e}"}
+        else:
+            if not isinstance(spec, dict):
+                result = {"id": None, "error": "invalid line: an outfit must be a JSON object"}
+            else:
+                # Whatever goes wrong with one outfit, the others still get planned
+                try:
+                    result = plan_outfit_spec(spec, choices)
+                except Exception as e:
+                    result = {"id": spec.get("id"), "error": f"couldn't plan this outfit: {e!r}"}
+        output.append(json.dumps(result, separators=(",", ":")))
+    return output
+
+
+def _batches(lines, batch_size):
+    lines = (line for line in lines if line.strip())
+    while batch := list(itertools.islice(lines, batch_size)):
+        yield batch
+
+
+def run(lines, out, workers: int = 1, choices: int = DEFAULT_CHOICES, batch_size: int = BATCH_SIZE):
+    """Streams the results of the input lines to out, in order"""
+    if workers <= 1:
+        _load_quietly()
+        for batch in _batches(lines, batch_size):
+            with contextlib.redirect_stdout(sys.stderr):
+                output = plan_lines(batch, choices)
+            out.write("\n".join(output) + "\n")
+        return
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as executor:
+        # Only a few batches are submitted ahead, reading on as the oldest one is written out
+        in_flight = deque()
+        for batch in _batches(lines, batch_size):
+            in_flight.append(executor.submit(plan_lines, batch, choices))
+            if len(in_flight) >= workers * BATCHES_IN_FLIGHT_PER_WORKER:
+                out.write("\n".join(in_flight.popleft().result()) + "\n")
+        while in_flight:
+            out.write("\n".join(in_flight.popleft().result()) + "\n")
+
+
+def _load_quietly():
+    with contextlib.redirect_stdout(sys.stderr):
+        _load()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("inputs", nargs="*", type=Path, help="JSONL files of outfits, stdin if none (or -)")
+    parser.add_argument("-o", "--output", type=Path, help="write the results here instead of stdout")
+    parser.add_argument("-j", "--workers", type=int, default=os.cpu_count() or 1, help="number of solver processes")
+    parser.add_argument("--choices", type=int, default=DEFAULT_CHOICES, help="choices listed per dyed slot")
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE, help="outfits per task")
+    args = parser.parse_args()
+
+    def lines():
+        if not args.inputs:
+            yield from sys.stdin
+        for path in args.inputs:
+            if str(path) == "-":
+                yield from sys.stdin
+            else:
+                with open(path) as f:
+                    yield from f
+
+    with open(args.output, 'w') if args.output else contextlib.nullcontext(sys.stdout) as out:
+        run(lines(), out, args.workers, args.choices, args.batch_size)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,219 @@
+"""
+Checks the outfit planner on the data in fixtures/wiki: for outfits picked by a seeded random
+generator (one to three dyed garments, the ingredients of random clothing, random item costs, with
+and without an ingredient type cost), plan_outfit's branch and bound has to give the same k cheapest
+plans as going through every combination of the garments' choices, and every plan's cost and
+shopping list have to add up.
+
+Then plan_outfits.py plans a sample JSONL of random outfits (some of them malformed) serially and
+on 4 processes, and the two outputs have to be identical.
+
+    python planner_check.py [--seed N] [--outfits N] [--lines N]
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import math
+import multiprocessing
+import random
+import sys
+import tempfile
+
+from solver_check import use_fixture_data
+
+SEED = 2024
+OUTFITS = 150
+
+# Plans compared per outfit
+K = 5
+
+# Outfits with more combinations of choices than this are skipped, going through them all takes too long
+BRUTE_FORCE_LIMIT = 20000
+
+LINES = 300
+# Workers and outfits per task of the parallel plan_outfits run, small tasks so they finish out of order
+WORKERS = 4
+BATCH_SIZE = 8
+
+# Lines plan_outfits has to answer with an error, mixed in with the outfits
+MALFORMED_LINES = [
+    'not json',
+    '["an", "array"]',
+    '{"id": "no such item", "shirt": {"item": "No Such Shirt"}}',
+    '{"id": "slot not an object", "hat": "Cowboy Hat"}',
+    '{"id": "item not a name", "pants": {"item": 3}}',
+]
+
+
+def random_outfits(rng: random.Random, count: int):
+    """(targets, clothing ingredients, costs, ingredient type cost) of count outfits the brute force can go through"""
+    from dyeing import STRENGTH_UNIT, MAX_STRENGTH, get_dye_table, get_ingredients_choices
+    from items import ingredient_registry
+    from outfit_planner import NEW_INGREDIENT_COST
+    from tailoring import get_tailoring_data
+
+    table = get_dye_table()
+    items = get_tailoring_data()
+    names = sorted({ingredient.name for ingredient in ingredient_registry.ingredients})
+    strengths = range(STRENGTH_UNIT, MAX_STRENGTH + 1, STRENGTH_UNIT)
+
+    outfits = []
+    while len(outfits) < count:
+        targets = [(rng.choice(table.color_names), rng.choice(strengths)) for _ in range(rng.randint(1, 3))]
+        clothing_ingredients = [ingredient for item in rng.sample(items, rng.randint(0, 3)) for ingredient in item.ingredients]
+        combinations = math.prod(len(get_ingredients_choices(color, strength, favour=clothing_ingredients)) for color, strength in targets)
+        if combinations > BRUTE_FORCE_LIMIT:
+            continue
+        costs = {name: rng.choice((0.5, 1.0, 2.0, 3.0)) for name in rng.sample(names, len(names) // 2)} if rng.random() < 0.5 else None
+        outfits.append((targets, clothing_ingredients, costs, rng.choice((0.0, NEW_INGREDIENT_COST))))
+    return outfits
+
+
+def brute_force(targets, clothing_ingredients, costs, ingredient_type_cost) -> list[tuple[float, dict]]:
+    """(cost, item counts by ingredient) of every plan, from every combination of the garments' choices"""
+    from dyeing import get_dye_table, get_ingredients_choices
+    from items import ingredient_registry
+
+    table = get_dye_table()
+    costs = costs or {}
+
+    per_garment = []
+    for color, strength in targets:
+        units = table.units[table.color_indices[color]]
+        per_garment.append([
+            {ingredient_registry[id_]: quantity // int(units[id_]) for id_, quantity in zip(choice.ids, choice.quantities)}
+            for choice in get_ingredients_choices(color, strength, favour=clothing_ingredients)
+        ])
+
+    plans = []
+    for combination in itertools.product(*per_garment):
+        counts = {}
+        for ingredient in clothing_ingredients:
+            counts[ingredient] = counts.get(ingredient, 0) + 1
+        for choice_counts in combination:
+            for ingredient, count in choice_counts.items():
+                counts[ingredient] = counts.get(ingredient, 0) + count
+        cost = sum(costs.get(ingredient.name, 1.0) * count for ingredient, count in counts.items()) + ingredient_type_cost * len(counts)
+        plans.append((cost, counts))
+    plans.sort(key=lambda plan: plan[0])
+    return plans
+
+
+def check_plans(outfits) -> bool:
+    from dyeing import get_dye_table
+    from items import ingredient_registry
+    from outfit_planner import plan_outfit
+
+    table = get_dye_table()
+    mismatches = []
+    for n, (targets, clothing_ingredients, costs, ingredient_type_cost) in enumerate(outfits):
+        where = f"outfit {n} ({', '.join(f'{color} at {strength}%' for color, strength in targets)})"
+        expected = brute_force(targets, clothing_ingredients, costs, ingredient_type_cost)
+        plans = plan_outfit(targets, clothing_ingredients, costs, K, ingredient_type_cost)
+
+        expected_costs = [cost for cost, _ in expected[:K]]
+        got_costs = [plan.cost for plan in plans]
+        if len(got_costs) != len(expected_costs) or not all(math.isclose(got, cost) for got, cost in zip(got_costs, expected_costs)):
+            mismatches.append(f"{where}: costs {got_costs}, expected {expected_costs}")
+            continue
+
+        # A plan's cost and shopping list have to be what its choices add up to
+        for plan in plans:
+            counts = {}
+            for ingredient in clothing_ingredients:
+                counts[ingredient] = counts.get(ingredient, 0) + 1
+            for (color, _), choice in zip(targets, plan.choices):
+                units = table.units[table.color_indices[color]]
+                for id_, quantity in zip(choice.ids, choice.quantities):
+                    ingredient = ingredient_registry[id_]
+                    counts[ingredient] = counts.get(ingredient, 0) + quantity // int(units[id_])
+            cost = sum((costs or {}).get(ingredient.name, 1.0) * count for ingredient, count in counts.items()) + ingredient_type_cost * len(counts)
+            if len(plan.choices) != len(targets) or counts != plan.shopping_list or not math.isclose(cost, plan.cost):
+                mismatches.append(f"{where}: a plan costing {plan.cost} doesn't add up ({plan})")
+                break
+
+    for mismatch in mismatches:
+        print(f"FAIL: {mismatch}")
+    print(f"{len(outfits) - len(mismatches)} of {len(outfits)} outfits have the same {K} cheapest plans as the brute force")
+    return not mismatches
+
+
+def sample_lines(rng: random.Random, count: int) -> list[str]:
+    """count lines of plan_outfits input: random outfits, some dyed at strengths that may not be makeable, and malformed ones"""
+    from dyeing import get_dye_table
+    from tailoring import get_tailoring_data
+
+    table = get_dye_table()
+    items_by_slot = {}
+    for item in get_tailoring_data():
+        items_by_slot.setdefault(item.type, []).append(item)
+
+    lines = []
+    for n in range(count):
+        if rng.random() < 0.05:
+            lines.append(rng.choice(MALFORMED_LINES))
+            continue
+        spec = {"id": n}
+        for slot, items in items_by_slot.items():
+            if rng.random() < 0.3:
+                continue
+            item = rng.choice(items)
+            spec[slot] = {"item": item.name}
+            if item.dyeable and rng.random() < 0.7:
+                spec[slot].update(color=rng.choice(table.color_names), strength=rng.choice((25, 50, 75, 100)))
+        lines.append(json.dumps(spec))
+    return lines
+
+
+def check_workers(lines: list[str]) -> bool:
+    """Whether plan_outfits gives the same output for the lines serially and on WORKERS processes"""
+    import plan_outfits
+
+    outputs = {}
+    for workers in (1, WORKERS):
+        out = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()):
+            plan_outfits.run(iter(lines), out, workers, batch_size=BATCH_SIZE)
+        outputs[workers] = out.getvalue().splitlines()
+
+    serial, parallel = outputs[1], outputs[WORKERS]
+    differences = [n for n, (a, b) in enumerate(zip(serial, parallel)) if a != b]
+    if len(serial) != len(parallel):
+        print(f"FAIL: -j1 wrote {len(serial)} lines, -j{WORKERS} {len(parallel)}")
+    for n in differences[:10]:
+        print(f"FAIL: line {n} differs:\n  -j1: {serial[n]}\n  -j{WORKERS}: {parallel[n]}")
+    errors = sum(1 for line in serial if '"error"' in line)
+    same = len(serial) == len(parallel) == len(lines) and not differences
+    print(f"plan_outfits -j1 and -j{WORKERS}: {'the same' if same else f'{len(differences)} lines differ'} ({len(lines)} lines, {errors} of them errors)")
+    return same
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the random outfits")
+    parser.add_argument("--outfits", type=int, default=OUTFITS, help="outfits compared with the brute force")
+    parser.add_argument("--lines", type=int, default=LINES, help="lines of the sample plan_outfits input")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        use_fixture_data(Path(scratch))
+        rng = random.Random(args.seed)
+        with contextlib.redirect_stdout(io.StringIO()):
+            outfits = random_outfits(rng, args.outfits)
+            lines = sample_lines(rng, args.lines)
+        passed = check_plans(outfits)
+
+        # The workers have to be forked to get the fixture data, otherwise they would load the snapshot (or the wiki)
+        if "fork" in multiprocessing.get_all_start_methods():
+            multiprocessing.set_start_method("fork", force=True)
+            passed = check_workers(lines) and passed
+        else:
+            print(f"plan_outfits -j1 and -j{WORKERS}: skipped, processes can't be forked here")
+        sys.exit(0 if passed else 1)
+
+
+if __name__ == '__main__':
+    main()
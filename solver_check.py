@@ -0,0 +1,96 @@
+"""
+Checks the dye solver against the original nested loops (_nested_loops_ingredients_choices) on the
+Dyeing page in fixtures/wiki: for every color and strength, with favoured ingredients picked from a
+seeded random generator (none, a few, many, repeated ones and ones that can't dye the color), the
+solver has to give exactly the same choices, each once. The choice counts of get_choice_counts have
+to match too.
+
+    python solver_check.py [--seed N] [--rounds N]
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import io
+import random
+import sys
+import tempfile
+
+CWD = Path(__file__).parent
+
+WIKI_DIR = CWD / "fixtures" / "wiki"
+
+SEED = 2024
+
+# How many favoured ingredients are picked for each color, the same ones are then repeated as well
+FAVOUR_SIZES = (0, 1, 2, 3, 5, 8)
+
+
+def use_fixture_data(scratch: Path):
+    """Loads the tailoring and dyeing data from fixtures/wiki instead of a snapshot or the wiki"""
+    import data_snapshot
+
+    snapshot_path = scratch / "snapshot.json"
+    with contextlib.redirect_stdout(io.StringIO()):
+        data_snapshot.refresh_snapshot(snapshot_path, WIKI_DIR)
+    data_snapshot._loaded[data_snapshot.SNAPSHOT_PATH] = data_snapshot.load_snapshot(snapshot_path)
+
+
+def favour_sets(rng: random.Random, ingredients: list, other_ingredients: list):
+    """Lists of favoured ingredients for one color, of every size in FAVOUR_SIZES"""
+    for size in FAVOUR_SIZES:
+        favour = rng.sample(ingredients, min(size, len(ingredients)))
+        yield favour
+        if favour:
+            # Repeats (e.g. two garments made from the same ingredient) and ones that can't dye this color
+            yield favour + rng.choices(favour, k=2) + rng.sample(other_ingredients, min(2, len(other_ingredients)))
+
+
+def check(rounds: int, seed: int) -> bool:
+    from dyeing import STRENGTH_UNIT, MAX_STRENGTH, _nested_loops_ingredients_choices, count_choices, get_dyeing_info, get_ingredients_choices
+
+    rng = random.Random(seed)
+    dyeing_info = get_dyeing_info()
+    every_ingredient = list(dict.fromkeys(ingredient for info in dyeing_info.values() for ingredient in info["ingredients"]))
+
+    def as_sets(choices):
+        return [frozenset(choice.combination) for choice in choices]
+
+    compared = 0
+    mismatches = []
+    for _ in range(rounds):
+        for color, info in dyeing_info.items():
+            ingredients = list(info["ingredients"])
+            other_ingredients = [ingredient for ingredient in every_ingredient if ingredient not in info["ingredients"]]
+            for favour in favour_sets(rng, ingredients, other_ingredients):
+                for strength in range(STRENGTH_UNIT, MAX_STRENGTH + 1, STRENGTH_UNIT):
+                    with contextlib.redirect_stdout(io.StringIO()):
+                        expected = set(as_sets(_nested_loops_ingredients_choices(color, strength, favour=favour)))
+                        got = as_sets(get_ingredients_choices(color, strength, favour=favour))
+                    counted = count_choices(color, strength, favour)
+                    compared += 1
+
+                    names = ", ".join(ingredient.name for ingredient in favour) or "nothing"
+                    if len(got) != len(set(got)) or set(got) != expected:
+                        mismatches.append(f"{color} at {strength}% favouring {names}: {len(got)} choices ({len(set(got))} unique), expected {len(expected)}")
+                    elif counted != len(got):
+                        mismatches.append(f"{color} at {strength}% favouring {names}: counted {counted} choices, there are {len(got)}")
+
+    for mismatch in mismatches:
+        print(f"FAIL: {mismatch}")
+    print(f"{compared - len(mismatches)} of {compared} colors, strengths and favoured ingredients match the nested loops")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--seed", type=int, default=SEED, help="seed of the favoured ingredient picks")
+    parser.add_argument("--rounds", type=int, default=1, help="favoured ingredient picks per color and size")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        use_fixture_data(Path(scratch))
+        sys.exit(0 if check(args.rounds, args.seed) else 1)
+
+
+if __name__ == '__main__':
+    main()
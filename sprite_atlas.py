@@ -0,0 +1,226 @@
+from pathlib import Path
+import json
+import mmap
+import os
+import struct
+import tempfile
+import time
+from PIL import Image
+
+# Every sprite of one item type (originals and dyed variants) packed into images/<type>/atlas.bin:
+#
+#     [RGBA pixels of every sprite, back to back][index (JSON)][footer]
+#
+# The index maps "<item name>/<variant>" (e.g. "SailorShirt/red_25") to [offset, width, height],
+# offsets counting from the start of the file. The footer is FOOTER_FORMAT: magic, version and the
+# length of the index. Everything is in one file so an atlas is swapped in with a single rename.
+ATLAS_NAME = "atlas.bin"
+ATLAS_MAGIC = b"SDVATLAS"
+ATLAS_VERSION = 1
+FOOTER_FORMAT = "<8sII"
+FOOTER_SIZE = struct.calcsize(FOOTER_FORMAT)
+
+
+def atlas_key(img_path: Path) -> str:
+    """images/<type>/<name>/<variant>.png is stored in the atlas of images/<type> as "<name>/<variant>"."""
+    return f"{img_path.parent.name}/{img_path.stem}"
+
+
+class SpriteAtlas:
+    """
+    A memory mapped atlas. Sprites are handed out as views on the mapping, so nothing is read or
+    copied until the pixels are actually used, and the OS shares the pages between processes.
+    """
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._view = view = memoryview(self._mmap)
+
+        if len(view) < FOOTER_SIZE:
+            raise ValueError(f"{path} is too short to be an atlas")
+        magic, version, index_size = struct.unpack(FOOTER_FORMAT, view[-FOOTER_SIZE:])
+        if magic != ATLAS_MAGIC:
+            raise ValueError(f"{path} is not an atlas")
+        if version != ATLAS_VERSION:
+            raise ValueError(f"{path} is version {version}, expected {ATLAS_VERSION}")
+
+        index_start = len(view) - FOOTER_SIZE - index_size
+        self.sprites: dict[str, tuple[int, int, int]] = {
+            key: tuple(entry) for key, entry in json.loads(bytes(view[index_start:-FOOTER_SIZE])).items()
+        }
+        self._pixels = view[:index_start]
+        for key, (offset, width, height) in self.sprites.items():
+            if offset < 0 or offset + width * height * 4 > len(self._pixels):
+                raise ValueError(f"{path} is corrupt: {key} is out of bounds")
+
+    def __contains__(self, key: str) -> bool:
+        return key in self.sprites
+
+    def __len__(self):
+        return len(self.sprites)
+
+    def size(self, key: str) -> tuple[int, int]:
+        _, width, height = self.sprites[key]
+        return width, height
+
+    def buffer(self, key: str) -> memoryview:
+        """The RGBA pixels of a sprite, without copying them"""
+        offset, width, height = self.sprites[key]
+        return self._pixels[offset:offset + width * height * 4]
+
+    def image(self, key: str) -> Image.Image:
+        """A read-only PIL image that shares its memory with the atlas"""
+        return Image.frombuffer("RGBA", self.size(key), self.buffer(key), "raw", "RGBA", 0, 1)
+
+    def close(self):
+        """
+        Unmaps the file (Windows can't replace or delete a mapped file). Raises BufferError if sprites
+        from image(), array() or buffer() are still in use, the mapping then stays until they're gone.
+        """
+        pixels_size = len(self._pixels)
+        self._pixels.release()
+        self._view.release()
+        try:
+            self._mmap.close()
+        except BufferError:
+            # Still usable, like before
+            self._view = memoryview(self._mmap)
+            self._pixels = self._view[:pixels_size]
+            raise
+
+    def array(self, key: str):
+        """A read-only (height, width, 4) uint8 array that shares its memory with the atlas"""
+        import numpy
+        width, height = self.size(key)
+        return numpy.frombuffer(self.buffer(key), dtype=numpy.uint8).reshape(height, width, 4)
+
+
+class AtlasWriter:
+    """
+    Builds the atlas for one item type. Pixels go straight into a temporary file that only replaces
+    the old atlas once everything is written, so readers never see half an atlas.
+
+        with AtlasWriter(CWD / "images" / "shirt") as writer:
+            writer.add("SailorShirt/original", image)
+    """
+    def __init__(self, type_dir: Path):
+        self.type_dir = type_dir
+        self.sprites: dict[str, tuple[int, int, int]] = {}
+        self.offset = 0
+        os.makedirs(type_dir, exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=type_dir, prefix=".atlas.", suffix=".bin.tmp")
+        self._file = os.fdopen(fd, 'wb')
+
+    def add(self, key: str, image):
+        """Adds a sprite from a PIL image or a (height, width, 4) uint8 array"""
+        if isinstance(image, Image.Image):
+            image = image.convert("RGBA")
+            width, height = image.size
+            data = image.tobytes()
+        else:
+            height, width = image.shape[:2]
+            data = image.tobytes()
+        self._write(key, data, width, height)
+
+    def copy(self, atlas: SpriteAtlas, key: str):
+        """Carries a sprite over from an existing atlas as is"""
+        width, height = atlas.size(key)
+        self._write(key, atlas.buffer(key), width, height)
+
+    def _write(self, key, data, width, height):
+        self._file.write(data)
+        self.sprites[key] = (self.offset, width, height)
+        self.offset += width * height * 4
+
+    def commit(self):
+        index = json.dumps(self.sprites, separators=(",", ":")).encode()
+        self._file.write(index)
+        self._file.write(struct.pack(FOOTER_FORMAT, ATLAS_MAGIC, ATLAS_VERSION, len(index)))
+        self._file.close()
+        # This process's mapping of the old atlas has to go first, or the rename fails on Windows
+        forget_atlas(self.type_dir)
+        try:
+            _replace(self._tmp_path, self.type_dir / ATLAS_NAME)
+        except BaseException:
+            os.unlink(self._tmp_path)
+            raise
+
+    def abort(self):
+        self._file.close()
+        os.unlink(self._tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *exc_info):
+        if exc_type is None:
+            self.commit()
+        else:
+            self.abort()
+
+
+_atlases: dict[Path, SpriteAtlas | None] = {}
+
+
+def get_atlas(type_dir: Path) -> SpriteAtlas | None:
+    """The atlas of images/<type>, or None if there isn't a (readable) one. Opened once per process."""
+    if type_dir not in _atlases:
+        atlas = None
+        path = type_dir / ATLAS_NAME
+        if path.exists():
+            try:
+                atlas = SpriteAtlas(path)
+            except ValueError as e:
+                print(f"Ignoring atlas: {e}")
+        _atlases[type_dir] = atlas
+    return _atlases[type_dir]
+
+
+def forget_atlas(type_dir: Path):
+    """
+    Makes the next get_atlas open the file again, and unmaps the old one. Images still using the old
+    mapping keep it alive until they are gone.
+    """
+    atlas = _atlases.pop(type_dir, None)
+    if atlas is not None:
+        try:
+            atlas.close()
+        except BufferError:
+            pass
+
+
+# How long a new atlas keeps trying to replace one another process has mapped (Windows only), in seconds
+REPLACE_RETRIES = (0.05, 0.2, 0.5, 1.0)
+
+
+def _replace(src, dst: Path):
+    for delay in REPLACE_RETRIES:
+        try:
+            os.replace(src, dst)
+            return
+        except PermissionError:
+            # Someone else still has it open, e.g. the character creator or sprites of it in use here
+            time.sleep(delay)
+    try:
+        os.replace(src, dst)
+    except PermissionError as e:
+        raise PermissionError(f"Can't replace {dst}, it is still open (close the character creator and build again)") from e
+
+
+def find_sprite(img_path: Path) -> Image.Image | None:
+    """The sprite for images/<type>/<name>/<variant>.png from the atlas, if it is in there"""
+    atlas = get_atlas(img_path.parent.parent)
+    key = atlas_key(img_path)
+    if atlas is None or key not in atlas:
+        return None
+    return atlas.image(key)
+
+
+def open_sprite(img_path: Path) -> Image.Image:
+    """The sprite from the atlas, or else from the PNG file"""
+    sprite = find_sprite(img_path)
+    if sprite is not None:
+        return sprite
+    with Image.open(img_path) as img:
+        return img.convert("RGBA")
@@ -0,0 +1,124 @@
+"""
+Measures how long it takes to import each module and to get the first frame of the CharacterCreator
+on screen, each in a fresh interpreter so nothing is already cached. Exits with a non-zero status if
+anything is over its budget.
+
+    python startup_benchmark.py [--repeat N]
+"""
+from pathlib import Path
+import argparse
+import json
+import subprocess
+import sys
+
+CWD = Path(__file__).parent
+
+# Seconds. Importing must not touch the network or the disk, so these only cover Python imports.
+IMPORT_BUDGETS = {
+    "items": 0.05,
+    "data_snapshot": 0.05,
+    "dyeing": 0.05,
+    "tailoring": 0.05,
+    "tint_images": 0.5,
+    "download_images": 1.0,
+    "main": 1.5,
+}
+
+# Seconds from starting the interpreter until the window has drawn its first frame
+FIRST_FRAME_BUDGET = 2.0
+
+# Modules that a plain `import dyeing` (what tooling uses for get_ingredients_choices) must not pull in
+DYEING_FORBIDDEN_IMPORTS = ["requests", "bs4", "PIL", "numpy", "tailoring", "tkinter"]
+
+IMPORT_SCRIPT = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+loaded = [name for name in {forbidden!r} if name in sys.modules]
+data_loaded = getattr(sys.modules.get("dyeing"), "_dyeing_info", None) is not None or getattr(sys.modules.get("tailoring"), "_tailoring_data", None) is not None
+print(json.dumps({{"seconds": elapsed, "loaded": loaded, "data_loaded": data_loaded}}))
+"""
+
+FIRST_FRAME_SCRIPT = """
+import json, time
+start = time.perf_counter()
+import tkinter
+try:
+    import main
+    app = main.CharacterCreator()
+except tkinter.TclError as e:
+    print(json.dumps({"error": str(e)}))
+    raise SystemExit
+imported = app.startup_started - start
+
+def done():
+    if "first_frame" not in app.startup_times:
+        app.after(1, done)
+        return
+    print(json.dumps({"import": imported, "init": imported + app.startup_times["init"], "first_frame": imported + app.startup_times["first_frame"]}))
+    app.destroy()
+
+app.after_idle(done)
+app.mainloop()
+"""
+
+
+def _run(script):
+    result = subprocess.run([sys.executable, "-c", script], cwd=CWD, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip())
+    # Only the last line is ours, modules may print on import
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_import(module, repeat):
+    runs = [_run(IMPORT_SCRIPT.format(module=module, forbidden=DYEING_FORBIDDEN_IMPORTS)) for _ in range(repeat)]
+    return min(run["seconds"] for run in runs), runs[0]["loaded"], runs[0]["data_loaded"]
+
+
+def measure_first_frame(repeat):
+    runs = [_run(FIRST_FRAME_SCRIPT) for _ in range(repeat)]
+    if "error" in runs[0]:
+        return None, runs[0]["error"]
+    return min(runs, key=lambda run: run["first_frame"]), None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--repeat", type=int, default=3, help="runs per measurement, the fastest one counts")
+    args = parser.parse_args()
+
+    failures = []
+
+    print("Import times:")
+    for module, budget in IMPORT_BUDGETS.items():
+        seconds, loaded, data_loaded = measure_import(module, args.repeat)
+        status = "ok" if seconds <= budget else "OVER BUDGET"
+        print(f"  {module:<16} {seconds * 1000:8.1f} ms  (budget {budget * 1000:.0f} ms) {status}")
+        if seconds > budget:
+            failures.append(f"importing {module} took {seconds:.3f}s")
+        if data_loaded:
+            failures.append(f"importing {module} loaded the wiki data")
+        if module == "dyeing" and loaded:
+            failures.append(f"importing dyeing also imported {', '.join(loaded)}")
+
+    print("Time to first frame:")
+    timings, error = measure_first_frame(args.repeat)
+    if timings is None:
+        print(f"  skipped ({error})")
+    else:
+        status = "ok" if timings["first_frame"] <= FIRST_FRAME_BUDGET else "OVER BUDGET"
+        print(f"  import main      {timings['import'] * 1000:8.1f} ms")
+        print(f"  window built     {timings['init'] * 1000:8.1f} ms")
+        print(f"  first frame      {timings['first_frame'] * 1000:8.1f} ms  (budget {FIRST_FRAME_BUDGET * 1000:.0f} ms) {status}")
+        if timings["first_frame"] > FIRST_FRAME_BUDGET:
+            failures.append(f"first frame took {timings['first_frame']:.3f}s")
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,27 +1,32 @@
-from bs4 import BeautifulSoup
-import requests
-from items import TailoringItem, IngredientItem
+from items import TailoringItem, IngredientItem, ingredient_registry
 from typing import List
+from data_snapshot import load_snapshot
+from wiki import BASE_URL, fetch_page, parse_tables
+from tracing import span, traced
 
 
 def _get_tailoring_data() -> List[TailoringItem]:
-
-    items = []
-
-    base = "https://stardewvalleywiki.com/"
-    wiki_url = base + "Tailoring"
-    response = requests.get(wiki_url)
+    with span("wiki.fetch", page="Tailoring"):
+        response = fetch_page("Tailoring")
 
     if response.status_code == 200:
         print("Successfully downloaded Tailoring page")
     else:
         # print("Failed to download Tailoring page")
         return
-    
-    soup = BeautifulSoup(response.text, 'html.parser')
-    
+
+    return _parse_tailoring_page(response.text)
+
+
+@traced
+def _parse_tailoring_page(html: str) -> List[TailoringItem]:
+    items = []
+    names_so_far = set()
+
+    base = BASE_URL
+
     # All data we want is in tables with the class "wikitable". The first table is for shirts, the second for pants, and the third for hats.
-    tables = soup.find_all("table", class_="wikitable")
+    tables = parse_tables(html, "wikitable")
     for table_idx, table in enumerate(tables):
         if table_idx > 2:
             break  # Other tables at the end are not relevant
@@ -50,14 +55,42 @@ def _get_tailoring_data() -> List[TailoringItem]:
                             ingredient_item.name = ingredient.find("a").get_text()
                             tailoring_item.ingredients.append(ingredient_item)
             # There are a lot of duplicates
-            names_so_far = [item.name for item in items]
             if tailoring_item.name in names_so_far:
                 tailoring_item.name = f"{tailoring_item.image_url.split('/')[-1].split('.')[0]}"
-            
+            names_so_far.add(tailoring_item.name)
 
             items.append(tailoring_item)
     return items
 
 
 
-tailoring_data = _get_tailoring_data()
\ No newline at end of file
+def _load_tailoring_data() -> List[TailoringItem]:
+    snapshot = load_snapshot()
+    if snapshot is not None:
+        items = snapshot.tailoring_data
+    else:
+        print("No wiki snapshot found, scraping the Tailoring page (run data_snapshot.py to save one)")
+        items = _get_tailoring_data()
+
+    # Share the ingredients with dyeing_info (and every other user) through the registry
+    for item in items or []:
+        item.ingredients = [ingredient_registry.intern(ingredient) for ingredient in item.ingredients]
+    return items
+
+
+_tailoring_data = None
+
+
+def get_tailoring_data() -> List[TailoringItem]:
+    """The tailoring items, loaded the first time they are needed so importing this module does no I/O."""
+    global _tailoring_data
+    if _tailoring_data is None:
+        _tailoring_data = _load_tailoring_data()
+    return _tailoring_data
+
+
+def __getattr__(name):
+    # Keeps `from tailoring import tailoring_data` working, it just loads the data at that point
+    if name == "tailoring_data":
+        return get_tailoring_data()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,135 @@
+"""
+Checks that tint_variants still dyes sprites exactly like the original tint did: blend_modes.multiply
+of the grayscale sprite with a solid color layer. The original's output for every color of the
+Dyeing page in fixtures/wiki, at every strength, of the sample sprites in fixtures/sprites (plus a
+gradient with every gray level) is saved in fixtures/golden/atlas.bin, and tint_variants has to
+match it byte for byte.
+
+    python tint_golden.py               compare tint_variants with the golden images
+    python tint_golden.py --regenerate  save the golden images again (needs blend_modes)
+"""
+from pathlib import Path
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+
+CWD = Path(__file__).parent
+
+GOLDEN_DIR = CWD / "fixtures" / "golden"
+SPRITES_DIR = CWD / "fixtures" / "sprites"
+
+# Each sample sprite is scaled down the way download_images saves it
+SPRITE_REDUCTIONS = {"shirt": 4, "pants": 4, "hat": 3, "ingredient": 1}
+
+
+def golden_sprites() -> dict:
+    """name -> the sprite (a PIL image) the golden images are made from"""
+    from PIL import Image
+    import numpy
+
+    sprites = {}
+    for name, reduction in SPRITE_REDUCTIONS.items():
+        with Image.open(SPRITES_DIR / f"{name}.png") as img:
+            sprites[name] = img.resize((img.width // reduction, img.height // reduction), Image.NEAREST)
+
+    # Every gray level once, with every alpha too (the tint ignores the alpha, this makes sure it keeps doing that)
+    levels = numpy.arange(256, dtype=numpy.uint8).reshape(16, 16)
+    gradient = numpy.stack([levels, levels, levels, levels.T], axis=-1)
+    sprites["gradient"] = Image.fromarray(gradient, "RGBA")
+    return sprites
+
+
+def reference_tint(base_image_path: Path, rgb, strength):
+    """The tint as it was before tint_variants: blend_modes on float64 images, one variant at a time"""
+    from PIL import Image
+    import blend_modes
+    import numpy
+    from tint_images import blend_opacity
+
+    base_image = Image.open(base_image_path)
+    base_image_gray = numpy.array(base_image.convert('L').convert('RGBA')).astype('float')
+
+    visible = base_image_gray[:, :, 3] > 0
+    max_value = base_image_gray[:, :, 0][visible].max(initial=0)
+
+    solid_color_image = numpy.array(Image.new('RGBA', base_image.size, tuple(int(value) for value in rgb))).astype('float')
+    return numpy.uint8(blend_modes.multiply(base_image_gray, solid_color_image, blend_opacity(max_value, strength)))
+
+
+def use_fixture_colors():
+    """Loads the colors from fixtures/wiki/Dyeing.html, so the golden images don't depend on a snapshot"""
+    import data_snapshot
+    from benchmarks import StandInWiki, use_wiki
+    from dyeing import get_dye_table
+
+    with StandInWiki() as wiki, contextlib.redirect_stdout(io.StringIO()):
+        use_wiki(wiki.base_url)
+        data_snapshot._loaded[data_snapshot.SNAPSHOT_PATH] = None
+        return get_dye_table()
+
+
+def regenerate(scratch: Path):
+    from sprite_atlas import AtlasWriter
+    from tint_images import STRENGTHS
+
+    table = use_fixture_colors()
+    with AtlasWriter(GOLDEN_DIR) as writer:
+        for name, sprite in golden_sprites().items():
+            sprite_path = scratch / f"{name}.png"
+            sprite.save(sprite_path)
+            for c, color_name in enumerate(table.color_names):
+                for strength in STRENGTHS:
+                    writer.add(f"{name}/{color_name}_{strength}", reference_tint(sprite_path, table.rgb[c], strength))
+    print(f"Saved {len(writer.sprites)} golden images to {GOLDEN_DIR}")
+
+
+def check(scratch: Path) -> bool:
+    import numpy
+    from sprite_atlas import SpriteAtlas, ATLAS_NAME
+    from tint_images import STRENGTHS, tint_variants
+
+    table = use_fixture_colors()
+    golden = SpriteAtlas(GOLDEN_DIR / ATLAS_NAME)
+    compared = 0
+    mismatches = []
+    for name, sprite in golden_sprites().items():
+        sprite_path = scratch / f"{name}.png"
+        sprite.save(sprite_path)
+        variants = tint_variants(sprite_path, table.color_names, STRENGTHS)
+        for c, color_name in enumerate(table.color_names):
+            for s, strength in enumerate(STRENGTHS):
+                key = f"{name}/{color_name}_{strength}"
+                compared += 1
+                if key not in golden:
+                    mismatches.append(f"{key}: no golden image, run with --regenerate")
+                    continue
+                expected = golden.array(key)
+                if variants[c, s].shape != expected.shape:
+                    mismatches.append(f"{key}: {variants[c, s].shape} instead of {expected.shape}")
+                elif not numpy.array_equal(variants[c, s], expected):
+                    difference = numpy.abs(variants[c, s].astype(int) - expected).max()
+                    count = numpy.count_nonzero((variants[c, s] != expected).any(axis=-1))
+                    mismatches.append(f"{key}: {count} pixels differ, by up to {difference}")
+
+    for mismatch in mismatches:
+        print(f"FAIL: {mismatch}")
+    print(f"{compared - len(mismatches)} of {compared} variants match the golden images")
+    return not mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--regenerate", action="store_true", help="save the golden images with the blend_modes tint")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as scratch:
+        if args.regenerate:
+            regenerate(Path(scratch))
+        else:
+            sys.exit(0 if check(Path(scratch)) else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,8 +2,16 @@ from pathlib import Path
 from PIL import Image
 import numpy
 import math
-import blend_modes
-from dyeing import dyeing_info
+import os
+import tempfile
+from dyeing import get_dye_table
+from sprite_atlas import AtlasWriter, atlas_key, find_sprite
+from tracing import traced
+
+STRENGTHS = (25, 50, 75, 100)
+
+# Bump whenever the tint changes (the blend, blend_opacity and its curves), so builds redo every variant
+TINT_ALGORITHM_VERSION = 1
 
 def map_between(value, start1, stop1, start2, stop2):
     return start2 + (stop2 - start2) * ((value - start1) / (stop1 - start1))
@@ -11,59 +19,128 @@ def map_between(value, start1, stop1, start2, stop2):
 def logistical_map(x, L, k, x0):
     return L / (1 + math.exp(-k*(x - x0)))
 
-def tint_image(base_image_path: Path, color_name, strength):
-    """
-    Takes a transparent image and dyes it with the specified color. To do this, first the base 
-    image is converted to grayscale, then a solid color image with the same size/edges is overlaid 
-    on top of the grayscale image with a blend mode of "overlay". The result is saved to the output 
-    path.
-    """
+def blend_opacity(max_value, strength):
+    """The opacity of the color layer for an image whose brightest (visible) gray value is max_value."""
+    lightness_score = logistical_map(max_value, 0.85, -0.07, 132) + 0.15
+    strength_score = map_between(strength, 25, 100, 1.25, 2)
 
-    color = dyeing_info[color_name]["rgb"]
+    opacity_0 = lightness_score * strength_score
+    return min(opacity_0 + (strength / 25 - 1) * (1 - opacity_0) / 3, 1)
 
-    output_path = base_image_path.parent / f"{color_name}_{strength}.png"
+def load_gray_image(base_image_path: Path):
+    """
+    Opens the base image once and returns its grayscale version as a uint8 (height, width) array 
+    along with its max value. The grayscale image has no transparency (like convert('L') before), 
+    so every pixel counts towards the max.
+    """
+    with Image.open(base_image_path) as base_image:
+        base_image_gray = numpy.asarray(base_image.convert('L'))
 
-    if output_path.exists():
-        # print(f"Skipping {output_path} (already exists)")
-        return
+    return base_image_gray, int(base_image_gray.max(initial=0))
 
-    # Open base image
-    base_image = Image.open(base_image_path)
+def tint_lut(colors_rgb, opacities):
+    """
+    The dyed RGB of every gray level: a uint8 array of shape (colors, strengths, 256, 3) for the 
+    (colors, 3) RGB values and (colors, strengths) opacities. This is blend_modes.multiply of an 
+    opaque gray pixel with an opaque solid color, worked out the same way in float64 (so the results 
+    are byte-for-byte the same), just for the 256 possible gray levels instead of for every pixel.
+    """
+    levels_norm = numpy.arange(256, dtype='float') / 255.0
+    colors_norm = numpy.asarray(colors_rgb).astype('float') / 255.0
 
-    base_image_gray = numpy.array(base_image.convert('L').convert('RGBA')).astype('float')
+    # Both layers are opaque, so the blend ratio is just the opacity
+    ratio = numpy.asarray(opacities, dtype='float')[:, :, None, None]
 
-    # Get the max value of the grayscale image (ignoring transparent pixels)
-    max_value = 0
-    for row in base_image_gray:
-        for pixel in row:
-            if pixel[3] > 0 and pixel[0] > max_value:
-                max_value = pixel[0]
+    # (colors, 1, 256, 3): the multiplied color doesn't depend on strength
+    comp = numpy.clip(colors_norm[:, None, None, :] * levels_norm[:, None], 0.0, 1.0)
 
-    # Lighten the grayscale image until its new max_value is 255 (careful to preserve transparency)
-    lightened_base_image_gray = numpy.copy(base_image_gray)
-    for i in range(len(lightened_base_image_gray)):
-        for j in range(len(lightened_base_image_gray[i])):
-            if lightened_base_image_gray[i][j][3] > 0:
-                lightened_base_image_gray[i][j][0] = map_between(lightened_base_image_gray[i][j][0], 0, max_value, 0, 255)
-    
-    # Create a solid color image with the same size as the base image
-    solid_color_raw = Image.new('RGBA', base_image.size, color)
+    lut = numpy.empty(ratio.shape[:2] + (256, 3), dtype=numpy.uint8)
+    lut[...] = (comp * ratio + levels_norm[:, None] * (1.0 - ratio)) * 255.0
+    return lut
 
-    # Convert to float array (required for blend_modes)
-    solid_color = numpy.array(solid_color_raw).astype('float')
+@traced
+def tint_variants(base_image_path: Path, color_names=None, strengths=STRENGTHS):
+    """
+    Dyes the base image with every color in color_names (defaults to all of dyeing_info) at every 
+    strength in one pass: a 256 entry lookup table is made per color and strength (see tint_lut) 
+    and every variant is a single gather of the grayscale image's pixels from it.
 
-    # Blend the grayscale image with the solid color image using the "overlay" blend mode
-    lightness_score = logistical_map(max_value, 0.85, -0.07, 132) + 0.15
-    strength_score = map_between(strength, 25, 100, 1.25, 2)
+    Returns a uint8 array of shape (len(color_names), len(strengths), height, width, 4).
+    """
+    table = get_dye_table()
+    if color_names is None:
+        color_names = table.color_names
+
+    base_image_gray, max_value = load_gray_image(base_image_path)
+
+    colors_rgb = table.rgb[[table.color_indices[color_name] for color_name in color_names]]
+    opacities = [[blend_opacity(max_value, strength) for strength in strengths] for _ in color_names]
+    lut = tint_lut(colors_rgb, opacities)
+
+    result = numpy.empty((len(color_names), len(strengths)) + base_image_gray.shape + (4,), dtype=numpy.uint8)
+    result[..., :3] = lut[:, :, base_image_gray]
+    result[..., 3] = 255
+    return result
+
+def variant_path(base_image_path: Path, color_name, strength) -> Path:
+    return base_image_path.parent / f"{color_name}_{strength}.png"
+
+def save_image_atomic(image_array, output_path: Path):
+    """Writes to a temporary file first so an interrupted build never leaves a truncated PNG behind."""
+    fd, tmp_path = tempfile.mkstemp(dir=output_path.parent, prefix=f".{output_path.stem}.", suffix=".png.tmp")
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            Image.fromarray(image_array).save(f, format="PNG")
+        os.replace(tmp_path, output_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+def tint_all_variants(base_image_path: Path, color_names=None, strengths=STRENGTHS, overwrite=False):
+    """
+    Saves every missing color/strength variant of the base image next to it (or every one, with 
+    overwrite). Returns how many were written.
+    """
+    if color_names is None:
+        color_names = get_dye_table().color_names
+
+    # Only colors with at least one missing strength need to be computed
+    missing = {
+        color_name: [strength for strength in strengths if overwrite or not variant_path(base_image_path, color_name, strength).exists()]
+        for color_name in color_names
+    }
+    color_names = [color_name for color_name in color_names if missing[color_name]]
+    if not color_names:
+        return 0
+
+    written = 0
+    variants = tint_variants(base_image_path, color_names, strengths)
+    for c, color_name in enumerate(color_names):
+        for s, strength in enumerate(strengths):
+            if strength in missing[color_name]:
+                save_image_atomic(variants[c, s], variant_path(base_image_path, color_name, strength))
+                written += 1
+    return written
+
+@traced
+def tint_image(base_image_path: Path, color_name, strength, atlas_writer: AtlasWriter | None = None):
+    """
+    Takes a transparent image and dyes it with the specified color. To do this, first the base 
+    image is converted to grayscale, then a solid color image with the same size/edges is overlaid 
+    on top of the grayscale image with a blend mode of "multiply". The result is saved to the output 
+    path, or added to atlas_writer instead if one is given.
+    """
 
-    opacity_0 = lightness_score * strength_score
-    blend_opacity = opacity_0 + (strength / 25 - 1) * (1 - opacity_0) / 3
+    output_path = variant_path(base_image_path, color_name, strength)
 
-    # print(f"{base_image_path} got max value of {max_value}, so a lightness score of {lightness_score} resulting in a blend opacity of {blend_opacity}")
+    if atlas_writer is None and (output_path.exists() or find_sprite(output_path) is not None):
+        # print(f"Skipping {output_path} (already exists)")
+        return
 
-    result_image = numpy.uint8(blend_modes.multiply(base_image_gray, solid_color, min(blend_opacity, 1)))
+    result_image = tint_variants(base_image_path, [color_name], [strength])[0, 0]
 
     # Save the result image
-
-    Image.fromarray(result_image).save(output_path)
-
+    if atlas_writer is not None:
+        atlas_writer.add(atlas_key(output_path), result_image)
+    else:
+        save_image_atomic(result_image, output_path)
@@ -0,0 +1,165 @@
+"""
+Optional timing spans around the hot paths, switched on with an environment variable:
+
+    FASHIONDEW_TRACE=trace.json python main.py
+
+When the process exits, every span is written to trace.json in the Chrome trace format (open it in
+chrome://tracing or https://ui.perfetto.dev) and a histogram of the durations of each kind of span
+to trace.histograms.json, and a summary is printed.
+
+With the variable unset, @traced hands back the function unchanged and span() is a shared no-op
+context manager, so the instrumentation costs nothing. Spans in the worker processes of a parallel
+download_images build aren't recorded, run it with -j 1 to see those.
+"""
+import atexit
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import nullcontext
+from pathlib import Path
+
+TRACE_PATH = os.environ.get("FASHIONDEW_TRACE") or None
+ENABLED = TRACE_PATH is not None
+
+# Past this many spans only the first ones are kept, a long GUI session shouldn't grow without bound
+MAX_EVENTS = 1_000_000
+
+# (name, start ns, duration ns, thread id, args)
+_events: list[tuple[str, int, int, int, dict | None]] = []
+_dropped = 0
+_thread_names: dict[int, str] = {}
+_start_ns = time.perf_counter_ns()
+_NULL_SPAN = nullcontext()
+
+
+class _Span:
+    __slots__ = ("name", "args", "start")
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        _record(self.name, self.start, time.perf_counter_ns() - self.start, self.args)
+
+
+def _record(name, start, duration, args):
+    global _dropped
+    if len(_events) >= MAX_EVENTS:
+        _dropped += 1
+        return
+    thread = threading.current_thread()
+    _thread_names.setdefault(thread.ident, thread.name)
+    _events.append((name, start, duration, thread.ident, args))
+
+
+def span(name: str, **args):
+    """with span("name"): ... times the block (args end up in the trace)"""
+    if not ENABLED:
+        return _NULL_SPAN
+    return _Span(name, args or None)
+
+
+def traced(fn):
+    """Times every call of fn as a span named after it"""
+    if not ENABLED:
+        return fn
+
+    name = fn.__qualname__
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter_ns()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _record(name, start, time.perf_counter_ns() - start, None)
+    return wrapper
+
+
+def chrome_trace() -> dict:
+    pid = os.getpid()
+    events = [
+        {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": thread_name}}
+        for tid, thread_name in _thread_names.items()
+    ]
+    for name, start, duration, tid, args in list(_events):
+        event = {"name": name, "ph": "X", "ts": (start - _start_ns) / 1000, "dur": duration / 1000, "pid": pid, "tid": tid}
+        if args:
+            event["args"] = {key: str(value) for key, value in args.items()}
+        events.append(event)
+    return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+
+def histograms() -> dict:
+    """
+    Per span name: count, total/mean/min/max and percentiles in milliseconds, and "buckets", how
+    many spans took under 1 µs, under 2 µs, under 4 µs, ... (keyed by the upper bound in µs).
+    """
+    durations: dict[str, list[int]] = {}
+    for name, _, duration, _, _ in list(_events):
+        durations.setdefault(name, []).append(duration)
+
+    result = {}
+    for name, values in durations.items():
+        values.sort()
+        buckets: dict[str, int] = {}
+        for value in values:
+            bound = 1 << max(0, (value // 1000).bit_length())
+            buckets[str(bound)] = buckets.get(str(bound), 0) + 1
+
+        def percentile(p):
+            return values[min(len(values) - 1, int(p / 100 * len(values)))] / 1e6
+
+        result[name] = {
+            "count": len(values),
+            "total_ms": sum(values) / 1e6,
+            "mean_ms": sum(values) / len(values) / 1e6,
+            "min_ms": values[0] / 1e6,
+            "p50_ms": percentile(50),
+            "p90_ms": percentile(90),
+            "p99_ms": percentile(99),
+            "max_ms": values[-1] / 1e6,
+            "buckets": buckets,
+        }
+    return result
+
+
+def export(path: Path):
+    """Writes the Chrome trace to path and the histograms next to it"""
+    path = Path(path)
+    with open(path, 'w') as f:
+        json.dump(chrome_trace(), f)
+    with open(path.with_suffix(".histograms.json"), 'w') as f:
+        json.dump(histograms(), f, indent=1)
+
+
+def print_summary(file=sys.stderr):
+    stats = sorted(histograms().items(), key=lambda entry: entry[1]["total_ms"], reverse=True)
+    print(f"{'span':<48} {'count':>7} {'total ms':>10} {'p50 ms':>9} {'p99 ms':>9} {'max ms':>9}", file=file)
+    for name, stat in stats:
+        print(f"{name:<48} {stat['count']:>7} {stat['total_ms']:>10.2f} {stat['p50_ms']:>9.3f} {stat['p99_ms']:>9.3f} {stat['max_ms']:>9.3f}", file=file)
+    if _dropped:
+        print(f"({_dropped} spans past the first {MAX_EVENTS} weren't kept)", file=file)
+
+
+def _export_at_exit():
+    # Worker processes of a pool inherit the variable, only the process that owns the trace writes it
+    if os.getpid() != _owner_pid or not _events:
+        return
+    export(Path(TRACE_PATH))
+    print(f"Wrote {len(_events)} spans to {TRACE_PATH}", file=sys.stderr)
+    print_summary()
+
+
+if ENABLED:
+    # Child processes (even spawned ones, which import this again) see the first process's pid here
+    _owner_pid = int(os.environ.setdefault("FASHIONDEW_TRACE_OWNER", str(os.getpid())))
+    atexit.register(_export_at_exit)
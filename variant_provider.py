@@ -0,0 +1,220 @@
+from pathlib import Path
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+import threading
+from PIL import Image
+from build_manifest import BuildManifest, file_hash, output_key, variant_digest
+from downloader import Downloader, DownloadJob
+from dyeing import get_dye_table
+from download_images import source_jobs, VALIDATORS_PATH
+from sprite_atlas import find_sprite
+from tint_images import STRENGTHS, tint_variants, save_image_atomic, variant_path
+
+# How much decoded sprite data the in-memory tier may hold on to
+VARIANT_CACHE_BUDGET = 32 * 1024 * 1024
+
+
+class VariantProvider:
+    """
+    Hands out the images under images/ (item originals, their dyed variants and ingredient icons)
+    without anything having to be rendered up front. A variant is tinted the first time it is
+    asked for, and a missing original or icon is downloaded first.
+
+    There are two cache tiers: an in-memory LRU of decoded images (bounded by budget_bytes), and the
+    disk, where every tinted variant is saved as images/<type>/<name>/<color>_<strength>.png (atlases
+    from download_images are used too). Saved variants are recorded in images/.manifest.json like the
+    ones download_images renders, and one whose original, color or tint changed since isn't used.
+    After tinting a variant, the strengths just above and below it are tinted in the background, as
+    those are what the slider shows next.
+
+    Everything here can be called from any thread.
+    """
+    def __init__(self, budget_bytes: int = VARIANT_CACHE_BUDGET):
+        self.budget_bytes = budget_bytes
+        self.size_bytes = 0
+        self.images: OrderedDict[Path, Image.Image] = OrderedDict()
+        self.lock = threading.Lock()
+
+        self._sources: dict[Path, DownloadJob] | None = None
+        self._downloader: Downloader | None = None
+        self._prefetcher = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prefetch")
+        self._prefetching: set[Path] = set()
+        self._manifest: BuildManifest | None = None
+        # file_hash of every original a variant was checked against, until it is downloaded again
+        self._source_hashes: dict[Path, str] = {}
+
+        # Images that couldn't be downloaded or tinted, they aren't tried again
+        self.failed: set[Path] = set()
+
+        self.hits = 0
+        self.disk_reads = 0
+        self.tinted = 0
+        self.downloaded = 0
+
+    def peek(self, path: Path) -> Image.Image | None:
+        """The image if it is in memory or on disk, without tinting or downloading anything."""
+        path = Path(path)
+        with self.lock:
+            image = self.images.get(path)
+            if image is not None:
+                self.hits += 1
+                self.images.move_to_end(path)
+                return image
+
+        image = find_sprite(path)
+        if image is None:
+            if not self._on_disk(path):
+                return None
+            try:
+                with Image.open(path) as img:
+                    image = img.convert("RGBA")
+            except Exception as e:
+                # A truncated or corrupt file, it is downloaded or tinted again the next time it is asked for
+                print(f"Couldn't read {path}, making it again: {e}")
+                path.unlink(missing_ok=True)
+                return None
+        self.disk_reads += 1
+        self._remember(path, image)
+        return image
+
+    def get(self, path: Path) -> Image.Image:
+        """The image, tinting (and downloading the original) if needed. Raises if that isn't possible."""
+        path = Path(path)
+        image = self.peek(path)
+        if image is not None:
+            return image
+        if path in self.failed:
+            raise FileNotFoundError(f"{path} couldn't be made earlier")
+
+        try:
+            sources = self.sources()
+            if path in sources:
+                self.downloader().download(sources[path])
+                self.downloaded += 1
+                with self.lock:
+                    self._source_hashes.pop(path, None)
+                image = self.peek(path)
+                if image is None:
+                    raise FileNotFoundError(path)
+                return image
+
+            original = path.parent / "original.png"
+            if original not in sources:
+                raise FileNotFoundError(f"{path} isn't an item, variant or ingredient image")
+            self.get(original)
+
+            color_name, strength = path.stem.rsplit("_", 1)
+            image = self._tint(original, color_name, int(strength))
+        except Exception:
+            self.failed.add(path)
+            raise
+
+        self._prefetch_adjacent(original, color_name, int(strength))
+        return image
+
+    def sources(self) -> dict[Path, DownloadJob]:
+        """Where every original and icon comes from, by the path it is saved to"""
+        if self._sources is None:
+            item_jobs, ingredient_jobs = source_jobs()
+            self._sources = {job.output_path: job for job in item_jobs + ingredient_jobs}
+        return self._sources
+
+    def downloader(self) -> Downloader:
+        if self._downloader is None:
+            self._downloader = Downloader(max_workers=2, validators_path=VALIDATORS_PATH)
+        return self._downloader
+
+    def manifest(self) -> BuildManifest:
+        with self.lock:
+            if self._manifest is None:
+                self._manifest = BuildManifest()
+            return self._manifest
+
+    def _digest(self, path: Path) -> str | None:
+        """The manifest digest the variant at path should have, None if it isn't a variant or its original is missing"""
+        original = path.parent / "original.png"
+        if path == original or original not in self.sources():
+            return None
+        color_name, _, strength = path.stem.rpartition("_")
+        table = get_dye_table()
+        if color_name not in table.color_indices or not strength.isdigit() or not original.exists():
+            return None
+
+        with self.lock:
+            source_hash = self._source_hashes.get(original)
+        if source_hash is None:
+            source_hash = file_hash(original)
+            with self.lock:
+                self._source_hashes[original] = source_hash
+        return variant_digest(source_hash, table.rgb[table.color_indices[color_name]], int(strength))
+
+    def _on_disk(self, path: Path) -> bool:
+        """Whether the PNG at path can be used: it exists and, if it is a variant, the manifest says it is up to date"""
+        if not path.exists():
+            return False
+        original = path.parent / "original.png"
+        if path == original or original not in self.sources():
+            # An original or an ingredient icon
+            return True
+        digest = self._digest(path)
+        manifest = self.manifest()
+        with self.lock:
+            return digest is not None and manifest.is_fresh(output_key(path), digest)
+
+    def _tint(self, original: Path, color_name: str, strength: int) -> Image.Image:
+        path = variant_path(original, color_name, strength)
+        digest = self._digest(path)
+        variant = tint_variants(original, [color_name], [strength])[0, 0]
+        save_image_atomic(variant, path)
+        manifest = self.manifest()
+        with self.lock:
+            if digest is not None:
+                manifest.record(output_key(path), digest)
+        self.tinted += 1
+        image = Image.fromarray(variant)
+        self._remember(path, image)
+        return image
+
+    def _prefetch_adjacent(self, original: Path, color_name: str, strength: int):
+        i = STRENGTHS.index(strength) if strength in STRENGTHS else -1
+        adjacent = [STRENGTHS[j] for j in (i - 1, i + 1) if i >= 0 and 0 <= j < len(STRENGTHS)]
+        for other in adjacent:
+            path = variant_path(original, color_name, other)
+            with self.lock:
+                if path in self._prefetching or path in self.images:
+                    continue
+                self._prefetching.add(path)
+            self._prefetcher.submit(self._prefetch, path)
+
+    def _prefetch(self, path: Path):
+        try:
+            if find_sprite(path) is None and not self._on_disk(path):
+                color_name, strength = path.stem.rsplit("_", 1)
+                self._tint(path.parent / "original.png", color_name, int(strength))
+        except Exception as e:
+            print(f"Failed to prefetch {path}: {e}")
+        finally:
+            with self.lock:
+                self._prefetching.discard(path)
+
+    def _remember(self, path: Path, image: Image.Image):
+        with self.lock:
+            if path in self.images:
+                return
+            self.images[path] = image
+            self.size_bytes += image.width * image.height * 4
+            while self.size_bytes > self.budget_bytes and len(self.images) > 1:
+                _, evicted = self.images.popitem(last=False)
+                self.size_bytes -= evicted.width * evicted.height * 4
+
+    def close(self):
+        self._prefetcher.shutdown(wait=False, cancel_futures=True)
+        if self._manifest is not None:
+            with self.lock:
+                self._manifest.save()
+        if self._downloader is not None:
+            self._downloader.save_validators()
+            self._downloader.close()
+
+
+variant_provider = VariantProvider()
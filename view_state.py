@@ -0,0 +1,87 @@
+from collections import Counter
+
+
+class ViewState:
+    """
+    The inputs of the GUI (what is worn in each slot, its color and strength, which tab is open, ...)
+    and the views drawn from them. Every view says which inputs it reads, so when an input changes
+    only the views that read it are marked stale, and refresh() redraws just those:
+
+        state = ViewState(shirt_selected=None, shirt_color=None)
+        state.view("clothing_ingredients", draw_clothing_ingredients, "shirt_selected")
+        state.set("shirt_color", "red")    (the clothing ingredients don't read it, nothing to redraw)
+        state.refresh()
+
+    Setting an input to the value it already has changes nothing. The counters say how often each
+    view was redrawn and how often a refresh could skip it.
+    """
+    def __init__(self, **inputs):
+        self.values: dict[str, object] = dict(inputs)
+        # View name -> (draw function, inputs it reads), in the order they are drawn in
+        self.views: dict[str, tuple[object, tuple[str, ...]]] = {}
+        self.readers: dict[str, list[str]] = {name: [] for name in inputs}
+        self.stale: set[str] = set()
+        self.refreshing = False
+
+        self.changes = 0
+        self.unchanged = 0
+        self.drawn: Counter = Counter()
+        self.skipped: Counter = Counter()
+
+    def view(self, name: str, draw, *inputs: str):
+        """Adds a view drawn by draw() from the inputs. It is stale (not drawn yet) until the next refresh."""
+        for input_name in inputs:
+            if input_name not in self.readers:
+                raise KeyError(f"{name} reads {input_name}, which isn't an input")
+            self.readers[input_name].append(name)
+        self.views[name] = (draw, inputs)
+        self.stale.add(name)
+
+    def get(self, name: str):
+        return self.values[name]
+
+    def set(self, name: str, value) -> bool:
+        """Changes an input and marks the views that read it stale, returns whether it changed"""
+        if name not in self.values:
+            raise KeyError(f"{name} isn't an input")
+        old = self.values[name]
+        if old is value or old == value:
+            self.unchanged += 1
+            return False
+        self.values[name] = value
+        self.stale.update(self.readers[name])
+        self.changes += 1
+        return True
+
+    def invalidate(self, name: str):
+        """Marks a view stale even though none of its inputs changed (e.g. its images came in)"""
+        self.stale.add(name)
+
+    def refresh(self):
+        """Draws the stale views (in the order they were added) and leaves the rest alone"""
+        if self.refreshing:
+            # A view changed an input while being drawn, the loop below picks that up
+            return
+        self.refreshing = True
+        try:
+            drawn_now = set()
+            while self.stale:
+                for name, (draw, _) in self.views.items():
+                    if name in self.stale:
+                        self.stale.discard(name)
+                        drawn_now.add(name)
+                        self.drawn[name] += 1
+                        draw()
+            for name in self.views:
+                if name not in drawn_now:
+                    self.skipped[name] += 1
+        finally:
+            self.refreshing = False
+
+    def stats(self) -> dict:
+        """How much drawing refresh() did and skipped, per view"""
+        return {
+            "changes": self.changes,
+            "unchanged": self.unchanged,
+            "views": {name: {"drawn": self.drawn[name], "skipped": self.skipped[name]} for name in self.views},
+        }
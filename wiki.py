@@ -0,0 +1,32 @@
+BASE_URL = "https://stardewvalleywiki.com/"
+
+
+def html_parser() -> str:
+    """lxml is several times faster than the built in parser, use it when it is installed."""
+    try:
+        import lxml  # noqa: F401
+        return "lxml"
+    except ImportError:
+        return "html.parser"
+
+
+def fetch_page(title: str):
+    import requests
+    return requests.get(BASE_URL + title, timeout=30)
+
+
+def parse_tables(html: str, class_: str):
+    """
+    Returns every <table> with the given class, in document order. Only those tables are built 
+    into a tree (the navigation, text and everything else on the page is skipped while parsing).
+    """
+    from bs4 import BeautifulSoup, SoupStrainer
+
+    def has_class(value):
+        # While parsing, the class attribute is still the raw "wikitable sortable" string
+        if value is None:
+            return False
+        return class_ in (value.split() if isinstance(value, str) else value)
+
+    soup = BeautifulSoup(html, html_parser(), parse_only=SoupStrainer("table", class_=has_class))
+    return soup.find_all("table", class_=class_)